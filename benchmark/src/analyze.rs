@@ -1,7 +1,9 @@
-use crate::json_helpers::{get_bool, get_f64, get_str, get_u64};
-use serde_json::Value;
-use std::collections::HashMap;
-use std::fs;
+use crate::results::{Run, load_results};
+use crate::text::contains_ignore_ascii_case;
+use std::collections::{BTreeSet, HashMap};
+use std::fmt::{self, Write as _};
+use std::fs::{self, File};
+use std::io::{self, BufWriter, Write};
 use std::path::Path;
 
 /// Anthropic Claude pricing per million tokens, keyed by model name.
@@ -34,23 +36,31 @@ const HAIKU_PRICING: Pricing = Pricing {
 };
 
 fn pricing_for_model(model: &str) -> &'static Pricing {
-    let m = model.to_ascii_lowercase();
-    if m.contains("opus") {
+    if contains_ignore_ascii_case(model, "opus") {
         &OPUS_PRICING
-    } else if m.contains("haiku") {
+    } else if contains_ignore_ascii_case(model, "haiku") {
         &HAIKU_PRICING
     } else {
         &SONNET_PRICING
     }
 }
 
-pub fn load_results(path: &Path) -> Vec<Value> {
-    let content = fs::read_to_string(path).expect("Failed to read results file");
-    content
-        .lines()
-        .filter(|l| !l.trim().is_empty())
-        .filter_map(|l| serde_json::from_str(l).ok())
-        .collect()
+impl Run {
+    fn cost_breakdown(&self) -> CostBreakdown {
+        let pricing = pricing_for_model(&self.model);
+        CostBreakdown {
+            cache_creation_cost: self.cache_creation_tokens as f64 * pricing.cache_creation
+                / 1_000_000.0,
+            cache_read_cost: self.cache_read_tokens as f64 * pricing.cache_read / 1_000_000.0,
+            output_cost: self.output_tokens as f64 * pricing.output / 1_000_000.0,
+            input_cost: self.input_tokens as f64 * pricing.input / 1_000_000.0,
+        }
+    }
+
+    /// Estimate cost for a run from its token counts and model pricing.
+    fn estimated_cost(&self) -> f64 {
+        self.cost_breakdown().total()
+    }
 }
 
 struct CostBreakdown {
@@ -60,288 +70,397 @@ struct CostBreakdown {
     input_cost: f64,
 }
 
-fn compute_cost_breakdown(run: &Value, pricing: &Pricing) -> CostBreakdown {
-    CostBreakdown {
-        cache_creation_cost: get_u64(run, "cache_creation_tokens") as f64 * pricing.cache_creation
-            / 1_000_000.0,
-        cache_read_cost: get_u64(run, "cache_read_tokens") as f64 * pricing.cache_read
-            / 1_000_000.0,
-        output_cost: get_u64(run, "output_tokens") as f64 * pricing.output / 1_000_000.0,
-        input_cost: get_u64(run, "input_tokens") as f64 * pricing.input / 1_000_000.0,
+impl CostBreakdown {
+    fn total(&self) -> f64 {
+        self.cache_creation_cost + self.cache_read_cost + self.output_cost + self.input_cost
     }
 }
 
-/// Estimate cost for a run from its token counts and model pricing.
-fn estimated_cost(run: &Value) -> f64 {
-    let pricing = pricing_for_model(get_str(run, "model"));
-    let b = compute_cost_breakdown(run, pricing);
-    b.cache_creation_cost + b.cache_read_cost + b.output_cost + b.input_cost
-}
-
-fn format_cost_breakdown(c: &CostBreakdown) -> String {
-    format!(
+fn write_cost_breakdown(out: &mut impl Write, c: &CostBreakdown) -> io::Result<()> {
+    writeln!(
+        out,
         "  cache_create=${:.3} cache_read=${:.3} output=${:.3} input=${:.3}",
         c.cache_creation_cost, c.cache_read_cost, c.output_cost, c.input_cost
     )
 }
 
-fn format_cost_delta(b: &CostBreakdown, g: &CostBreakdown) -> String {
+fn write_cost_delta(out: &mut impl Write, b: &CostBreakdown, g: &CostBreakdown) -> io::Result<()> {
     let dc = g.cache_creation_cost - b.cache_creation_cost;
     let dr = g.cache_read_cost - b.cache_read_cost;
     let do_ = g.output_cost - b.output_cost;
     let di = g.input_cost - b.input_cost;
-    format!(
+    writeln!(
+        out,
         "  \u{0394}cache_create={:+.3} \u{0394}cache_read={:+.3} \u{0394}output={:+.3} \u{0394}input={:+.3}",
         dc, dr, do_, di
     )
 }
 
-fn group_by<'a>(results: &'a [Value], keys: &[&str]) -> HashMap<Vec<String>, Vec<&'a Value>> {
-    let mut groups: HashMap<Vec<String>, Vec<&Value>> = HashMap::new();
+/// Render `name=count` pairs after `prefix` into a single buffer.
+fn format_tool_counts(prefix: &str, tools: &HashMap<&str, f64>) -> String {
+    let mut out = String::from(prefix);
+    for (i, (k, v)) in tools.iter().enumerate() {
+        if i > 0 {
+            out.push_str(", ");
+        }
+        let _ = write!(out, "{k}={v:.0}");
+    }
+    out
+}
+
+/// Valid runs for one task, bucketed by mode.
+struct TaskRuns<'a> {
+    /// Repo of the first run seen for this task.
+    repo: &'a str,
+    modes: HashMap<&'a str, ModeRuns<'a>>,
+}
+
+/// Valid runs for one `(task, mode)` pair. Each metric is also laid out as
+/// its own column, parallel to `runs`, and correctness is tallied as runs are
+/// bucketed, so the report's statistics never revisit the runs themselves.
+#[derive(Default)]
+struct ModeRuns<'a> {
+    runs: Vec<&'a Run>,
+    /// Indexed by `Metric as usize`.
+    columns: [Vec<f64>; Metric::ALL.len()],
+    correct: usize,
+}
+
+impl<'a> ModeRuns<'a> {
+    fn push(&mut self, r: &'a Run) {
+        self.runs.push(r);
+        for m in Metric::ALL {
+            self.columns[m as usize].push(m.of(r));
+        }
+        self.correct += usize::from(r.correct);
+    }
+
+    fn column(&self, metric: Metric) -> &[f64] {
+        &self.columns[metric as usize]
+    }
+
+    fn stats(&self, metric: Metric) -> Stats {
+        compute_stats(&mut self.column(metric).to_vec())
+    }
+
+    fn correct_pct(&self) -> f64 {
+        self.correct as f64 / self.runs.len() as f64 * 100.0
+    }
+}
+
+/// Everything the report needs from the raw results, gathered in one pass.
+struct Scan<'a> {
+    valid: usize,
+    errors: usize,
+    models: BTreeSet<&'a str>,
+    tasks: BTreeSet<&'a str>,
+    modes: BTreeSet<&'a str>,
+    repos: BTreeSet<&'a str>,
+    max_rep: u64,
+    /// First non-null glean build commit and version seen.
+    glean_commit: Option<&'a str>,
+    glean_version: Option<&'a str>,
+    by_task: HashMap<&'a str, TaskRuns<'a>>,
+}
+
+/// Skip errored runs and, in the same loop, collect the report metadata and
+/// bucket each run by `(task, mode)`.
+fn scan(results: &[Run]) -> Scan<'_> {
+    let mut s = Scan {
+        valid: 0,
+        errors: 0,
+        models: BTreeSet::new(),
+        tasks: BTreeSet::new(),
+        modes: BTreeSet::new(),
+        repos: BTreeSet::new(),
+        max_rep: 0,
+        glean_commit: None,
+        glean_version: None,
+        by_task: HashMap::new(),
+    };
     for r in results {
-        if r.get("error").is_some() {
+        if r.error.is_some() {
+            s.errors += 1;
             continue;
         }
-        let key: Vec<String> = keys.iter().map(|k| get_str(r, k).to_string()).collect();
-        groups.entry(key).or_default().push(r);
+        s.valid += 1;
+
+        let task = &*r.task;
+        let mode = &*r.mode;
+        let repo = &*r.repo;
+        s.models.insert(&r.model);
+        s.tasks.insert(task);
+        s.modes.insert(mode);
+        let repo_label = if repo.is_empty() { "synthetic" } else { repo };
+        s.repos.insert(repo_label);
+        s.max_rep = s.max_rep.max(r.repetition);
+        if s.glean_commit.is_none() {
+            s.glean_commit = r.glean_commit.as_deref();
+        }
+        if s.glean_version.is_none() {
+            s.glean_version = r.glean_version.as_deref();
+        }
+
+        let bucket = s
+            .by_task
+            .entry(task)
+            .or_insert_with(|| TaskRuns {
+                repo,
+                modes: HashMap::new(),
+            })
+            .modes
+            .entry(mode)
+            .or_default();
+        bucket.push(r);
+    }
+    s
+}
+
+/// A per-run figure reported in the comparison tables.
+#[derive(Clone, Copy, PartialEq, Eq)]
+enum Metric {
+    ContextTokens,
+    OutputTokens,
+    Turns,
+    ToolCalls,
+    EstimatedCost,
+    DurationMs,
+}
+
+impl Metric {
+    const ALL: [Metric; 6] = [
+        Metric::ContextTokens,
+        Metric::OutputTokens,
+        Metric::Turns,
+        Metric::ToolCalls,
+        Metric::EstimatedCost,
+        Metric::DurationMs,
+    ];
+
+    fn of(self, r: &Run) -> f64 {
+        match self {
+            Metric::ContextTokens => r.context_tokens as f64,
+            Metric::OutputTokens => r.output_tokens as f64,
+            Metric::Turns => r.num_turns as f64,
+            Metric::ToolCalls => r.num_tool_calls as f64,
+            Metric::EstimatedCost => r.estimated_cost(),
+            Metric::DurationMs => r.duration_ms as f64,
+        }
     }
-    groups
 }
 
 struct Stats {
     median: f64,
 }
 
-fn compute_stats(values: &[f64]) -> Stats {
+/// Summarize `values`, reordering them in place rather than sorting a copy.
+/// Every caller passes a scratch copy made for this call.
+fn compute_stats(values: &mut [f64]) -> Stats {
+    Stats {
+        median: median_in_place(values),
+    }
+}
+
+/// Upper median via quickselect: O(n), and only partially reorders `values`.
+fn median_in_place(values: &mut [f64]) -> f64 {
     if values.is_empty() {
-        return Stats { median: 0.0 };
+        return 0.0;
     }
-    let mut sorted = values.to_vec();
-    sorted.sort_by(f64::total_cmp);
-    let median = sorted[sorted.len() / 2];
-    Stats { median }
+    let mid = values.len() / 2;
+    *values.select_nth_unstable_by(mid, f64::total_cmp).1
 }
 
 fn ascii_sparkline(values: &[u64]) -> String {
-    if values.is_empty() {
+    // Pre-encoded UTF-8 for each level, so building the line is a byte copy
+    // per value rather than a char encode.
+    const LEVELS: [&str; 9] = [
+        " ", "\u{2581}", "\u{2582}", "\u{2583}", "\u{2584}", "\u{2585}", "\u{2586}", "\u{2587}",
+        "\u{2588}",
+    ];
+    let Some(&first) = values.first() else {
         return String::new();
-    }
-    let lo = *values.iter().min().unwrap();
-    let hi = *values.iter().max().unwrap();
+    };
+    let (lo, hi) = values
+        .iter()
+        .fold((first, first), |(lo, hi), &v| (lo.min(v), hi.max(v)));
     if lo == hi {
-        return "\u{2584}".repeat(values.len());
+        return LEVELS[4].repeat(values.len());
     }
-    let chars = [
-        ' ', '\u{2581}', '\u{2582}', '\u{2583}', '\u{2584}', '\u{2585}', '\u{2586}', '\u{2587}',
-        '\u{2588}',
-    ];
-    values
-        .iter()
-        .map(|&v| {
-            let idx = ((v - lo) as f64 / (hi - lo) as f64 * 8.0) as usize;
-            chars[idx.min(8)]
-        })
-        .collect()
+    // Block characters are 3 bytes in UTF-8 (the space is 1).
+    let mut out = String::with_capacity(values.len() * 3);
+    let span = (hi - lo) as f64;
+    for &v in values {
+        let idx = ((v - lo) as f64 / span * 8.0) as usize;
+        out.push_str(LEVELS[idx.min(8)]);
+    }
+    out
 }
 
-fn format_delta(baseline: f64, glean: f64) -> String {
-    if baseline == 0.0 {
-        return "\u{2014}".into();
-    }
-    let pct = ((glean - baseline) / baseline) * 100.0;
-    if pct > 0.0 {
-        format!("+{pct:.0}%")
-    } else {
-        format!("{pct:.0}%")
+/// Percentage change from baseline to glean, written straight into the
+/// report line instead of through an intermediate `String`.
+struct Delta {
+    baseline: f64,
+    glean: f64,
+}
+
+impl fmt::Display for Delta {
+    fn fmt(&self, f: &mut fmt::Formatter<'_>) -> fmt::Result {
+        if self.baseline == 0.0 {
+            return f.write_str("\u{2014}");
+        }
+        let pct = ((self.glean - self.baseline) / self.baseline) * 100.0;
+        // The `+` flag signs every change; an exact tie stays a bare "0%".
+        if pct == 0.0 {
+            f.write_str("0%")
+        } else {
+            write!(f, "{pct:+.0}%")
+        }
     }
 }
 
-fn find_median_run<'a>(runs: &'a [&Value], metric: &str) -> &'a Value {
-    find_median_run_by(runs, &|r| get_f64(r, metric))
+fn format_delta(baseline: f64, glean: f64) -> Delta {
+    Delta { baseline, glean }
 }
 
-/// Find the median run using a custom value function (e.g. estimated cost).
-fn find_median_run_by<'a>(runs: &'a [&Value], f: &dyn Fn(&Value) -> f64) -> &'a Value {
-    if runs.is_empty() {
-        return &Value::Null;
-    }
-    let mut sorted: Vec<&Value> = runs.to_vec();
-    sorted.sort_by(|a, b| f(a).total_cmp(&f(b)));
-    sorted[sorted.len() / 2]
+/// Find the median run of `bucket` under each metric (e.g. estimated cost and
+/// context tokens), reusing one scratch buffer across all of them.
+///
+/// The middle element is found by selection rather than a full sort. Ties
+/// break on input order, so the pick matches what a stable sort would return.
+fn find_median_runs<'a, const N: usize>(bucket: &ModeRuns<'a>, keys: [Metric; N]) -> [&'a Run; N] {
+    let mut keyed: Vec<(f64, usize)> = Vec::with_capacity(bucket.runs.len());
+    keys.map(|metric| {
+        keyed.clear();
+        keyed.extend(bucket.column(metric).iter().copied().zip(0..));
+        let mid = keyed.len() / 2;
+        let (_, &mut (_, idx), _) =
+            keyed.select_nth_unstable_by(mid, |a, b| a.0.total_cmp(&b.0).then(a.1.cmp(&b.1)));
+        bucket.runs[idx]
+    })
 }
 
-fn merge_tool_calls(runs: &[&Value]) -> HashMap<String, f64> {
-    let mut all_tools: Vec<String> = Vec::new();
+/// Median call count per tool across `runs`, in one pass over the tools each
+/// run actually used. Runs that never called a tool count as zero for it.
+fn merge_tool_calls<'a>(runs: &[&'a Run]) -> HashMap<&'a str, f64> {
+    let mut per_tool: HashMap<&str, Vec<f64>> = HashMap::new();
     for run in runs {
-        if let Some(tc) = run.get("tool_calls").and_then(Value::as_object) {
-            for k in tc.keys() {
-                if !all_tools.contains(k) {
-                    all_tools.push(k.clone());
-                }
-            }
+        for (name, &count) in &run.tool_calls {
+            per_tool
+                .entry(name.as_str())
+                .or_default()
+                .push(count as f64);
         }
     }
-    let mut result = HashMap::new();
-    for tool in &all_tools {
-        let mut counts: Vec<f64> = runs
-            .iter()
-            .map(|r| {
-                r.get("tool_calls")
-                    .and_then(|tc| tc.get(tool.as_str()))
-                    .and_then(Value::as_f64)
-                    .unwrap_or(0.0)
-            })
-            .collect();
-        counts.sort_by(f64::total_cmp);
-        let median = counts[counts.len() / 2];
-        result.insert(tool.clone(), median);
-    }
-    result
+    per_tool
+        .into_iter()
+        .map(|(name, mut counts)| {
+            counts.resize(runs.len(), 0.0);
+            (name, median_in_place(&mut counts))
+        })
+        .collect()
 }
 
-pub fn generate_report(results: &[Value]) -> String {
-    let valid: Vec<&Value> = results
-        .iter()
-        .filter(|r| r.get("error").is_none())
-        .collect();
-    let error_count = results.len() - valid.len();
+/// Write the markdown report for `results` to `out`, line by line. The report
+/// ends with a single newline; stdout adds a blank line after it.
+pub fn write_report(results: &[Run], out: &mut impl Write) -> io::Result<()> {
+    let scan = scan(results);
 
-    if valid.is_empty() {
-        return if results.is_empty() {
-            "# Error\n\nNo valid results found in file.\n".into()
+    if scan.valid == 0 {
+        writeln!(out, "# Error")?;
+        writeln!(out)?;
+        if results.is_empty() {
+            writeln!(out, "No valid results found in file.")?;
         } else {
-            format!("# Error\n\nAll {} runs failed.\n", results.len())
-        };
+            writeln!(out, "All {} runs failed.", results.len())?;
+        }
+        return Ok(());
     }
 
-    let mut all_models: Vec<&str> = valid.iter().map(|r| get_str(r, "model")).collect();
-    all_models.sort();
-    all_models.dedup();
-    let mut all_tasks: Vec<&str> = valid.iter().map(|r| get_str(r, "task")).collect();
-    all_tasks.sort();
-    all_tasks.dedup();
-    let mut all_modes: Vec<&str> = valid.iter().map(|r| get_str(r, "mode")).collect();
-    all_modes.sort();
-    all_modes.dedup();
-    let mut all_repos: Vec<&str> = valid
-        .iter()
-        .map(|r| {
-            let s = get_str(r, "repo");
-            if s.is_empty() { "synthetic" } else { s }
-        })
-        .collect();
-    all_repos.sort();
-    all_repos.dedup();
+    let all_models: Vec<&str> = scan.models.iter().copied().collect();
+    let all_repos: Vec<&str> = scan.repos.iter().copied().collect();
+    let num_reps = scan.max_rep + 1;
 
-    let max_rep = valid
-        .iter()
-        .map(|r| get_u64(r, "repetition"))
-        .max()
-        .unwrap_or(0);
-    let num_reps = max_rep + 1;
-
-    let mut lines = Vec::new();
-
-    // Extract glean build commit from results (first non-null value)
-    let glean_commit: Option<&str> = valid
-        .iter()
-        .filter_map(|r| r.get("glean_commit").and_then(Value::as_str))
-        .next();
-    let glean_version: Option<&str> = valid
-        .iter()
-        .filter_map(|r| r.get("glean_version").and_then(Value::as_str))
-        .next();
-
-    lines.push("# glean Benchmark Results".into());
-    lines.push(String::new());
-    lines.push(format!(
+    writeln!(out, "# glean Benchmark Results")?;
+    writeln!(out)?;
+    writeln!(
+        out,
         "**Generated:** {}",
         chrono::Local::now().format("%Y-%m-%d %H:%M:%S")
-    ));
-    if let Some(version) = glean_version {
-        lines.push(format!(" | **glean:** {version}"));
-    } else if let Some(commit) = glean_commit {
-        lines.push(format!(" | **glean build:** {commit}"));
+    )?;
+    if let Some(version) = scan.glean_version {
+        writeln!(out, " | **glean:** {version}")?;
+    } else if let Some(commit) = scan.glean_commit {
+        writeln!(out, " | **glean build:** {commit}")?;
     }
-    lines.push(String::new());
-    let mut runs_line = format!("**Runs:** {} valid", valid.len());
-    if error_count > 0 {
-        runs_line.push_str(&format!(" ({error_count} errors)"));
+    writeln!(out)?;
+    write!(out, "**Runs:** {} valid", scan.valid)?;
+    if scan.errors > 0 {
+        write!(out, " ({} errors)", scan.errors)?;
     }
-    lines.push(runs_line);
-    lines.push(format!(
+    writeln!(out)?;
+    writeln!(
+        out,
         " | **Models:** {} | **Repos:** {} | **Reps:** {num_reps}",
         all_models.join(", "),
         all_repos.join(", ")
-    ));
-    lines.push(String::new());
-    lines.push("## Context Efficiency".into());
-    lines.push(String::new());
-    lines.push("The primary metric. Context tokens (input + cached) represent the actual context processed each turn. This compounds because each turn re-sends conversation history.".into());
-    lines.push(String::new());
-    lines.push("### Per-task comparison".into());
-    lines.push(String::new());
-
-    let valid_owned: Vec<Value> = valid.iter().copied().cloned().collect();
-    let task_groups = group_by(&valid_owned, &["task"]);
-
-    for &task_name in &all_tasks {
-        let key = vec![task_name.to_string()];
-        let task_results: Vec<&Value> = match task_groups.get(&key) {
-            Some(v) => v.to_vec(),
-            None => continue,
+    )?;
+    writeln!(out)?;
+    writeln!(out, "## Context Efficiency")?;
+    writeln!(out)?;
+    writeln!(
+        out,
+        "The primary metric. Context tokens (input + cached) represent the actual context processed each turn. This compounds because each turn re-sends conversation history."
+    )?;
+    writeln!(out)?;
+    writeln!(out, "### Per-task comparison")?;
+    writeln!(out)?;
+
+    // Tasks are separated by a blank line, written before each task after the
+    // first so that the last one isn't followed by a stray blank line.
+    let mut wrote_task = false;
+    for &task_name in &scan.tasks {
+        let Some(task_runs) = scan.by_task.get(task_name) else {
+            continue;
         };
 
-        lines.push(format!("#### {task_name}"));
-        lines.push(String::new());
+        if wrote_task {
+            writeln!(out)?;
+        }
+        wrote_task = true;
+        writeln!(out, "#### {task_name}")?;
+        writeln!(out)?;
 
-        let task_repo = get_str(task_results[0], "repo");
+        let task_repo = task_runs.repo;
         if !task_repo.is_empty() && task_repo != "synthetic" {
-            lines.push(format!("*Repo: {task_repo}*"));
-            lines.push(String::new());
+            writeln!(out, "*Repo: {task_repo}*")?;
+            writeln!(out)?;
         }
 
-        let mode_groups = {
-            let mut m: HashMap<&str, Vec<&Value>> = HashMap::new();
-            for r in &task_results {
-                m.entry(get_str(r, "mode")).or_default().push(r);
-            }
-            m
-        };
+        let mode_groups = &task_runs.modes;
 
         let has_baseline = mode_groups.contains_key("baseline");
         let has_glean = mode_groups.contains_key("glean");
 
         if has_baseline && has_glean {
-            let baseline_runs = &mode_groups["baseline"];
-            let glean_runs = &mode_groups["glean"];
-
-            let metrics: &[(&str, &str)] = &[
-                ("Context tokens", "context_tokens"),
-                ("Output tokens", "output_tokens"),
-                ("Turns", "num_turns"),
-                ("Tool calls", "num_tool_calls"),
-                ("Est. cost", "estimated_cost"),
-                ("Duration ms", "duration_ms"),
+            let baseline = &mode_groups["baseline"];
+            let glean = &mode_groups["glean"];
+
+            let metrics: &[(&str, Metric)] = &[
+                ("Context tokens", Metric::ContextTokens),
+                ("Output tokens", Metric::OutputTokens),
+                ("Turns", Metric::Turns),
+                ("Tool calls", Metric::ToolCalls),
+                ("Est. cost", Metric::EstimatedCost),
+                ("Duration ms", Metric::DurationMs),
             ];
 
-            lines.push("| Metric | baseline | glean | delta |".into());
-            lines.push("|--------|----------|-------|-------|".into());
+            writeln!(out, "| Metric | baseline | glean | delta |")?;
+            writeln!(out, "|--------|----------|-------|-------|")?;
 
-            for &(label, key) in metrics {
-                let is_cost = key == "estimated_cost";
-                let b_vals: Vec<f64> = if is_cost {
-                    baseline_runs.iter().map(|r| estimated_cost(r)).collect()
-                } else {
-                    baseline_runs.iter().map(|r| get_f64(r, key)).collect()
-                };
-                let g_vals: Vec<f64> = if is_cost {
-                    glean_runs.iter().map(|r| estimated_cost(r)).collect()
-                } else {
-                    glean_runs.iter().map(|r| get_f64(r, key)).collect()
-                };
-                let b_stats = compute_stats(&b_vals);
-                let g_stats = compute_stats(&g_vals);
+            for &(label, metric) in metrics {
+                let is_cost = metric == Metric::EstimatedCost;
+                let b_stats = baseline.stats(metric);
+                let g_stats = glean.stats(metric);
                 let delta = format_delta(b_stats.median, g_stats.median);
 
                 let (b_fmt, g_fmt) = if is_cost {
@@ -356,245 +475,195 @@ pub fn generate_report(results: &[Value]) -> String {
                     )
                 };
 
-                lines.push(format!(
-                    "| {label} (median) | {b_fmt} | {g_fmt} | {delta} |"
-                ));
+                writeln!(out, "| {label} (median) | {b_fmt} | {g_fmt} | {delta} |")?;
             }
 
             // Correctness
-            let b_correct = baseline_runs
-                .iter()
-                .filter(|r| get_bool(r, "correct"))
-                .count();
-            let g_correct = glean_runs.iter().filter(|r| get_bool(r, "correct")).count();
-            let b_pct = b_correct as f64 / baseline_runs.len() as f64 * 100.0;
-            let g_pct = g_correct as f64 / glean_runs.len() as f64 * 100.0;
-            lines.push(format!(
+            let b_pct = baseline.correct_pct();
+            let g_pct = glean.correct_pct();
+            writeln!(
+                out,
                 "| Correctness | {b_pct:.0}% | {g_pct:.0}% | \u{2014} |"
-            ));
-            lines.push(String::new());
+            )?;
+            writeln!(out)?;
 
             // Cost breakdown (estimated from tokens)
-            let b_median_run = find_median_run_by(baseline_runs, &estimated_cost);
-            let g_median_run = find_median_run_by(glean_runs, &estimated_cost);
-            let b_pricing = pricing_for_model(get_str(b_median_run, "model"));
-            let g_pricing = pricing_for_model(get_str(g_median_run, "model"));
-            let b_costs = compute_cost_breakdown(b_median_run, b_pricing);
-            let g_costs = compute_cost_breakdown(g_median_run, g_pricing);
-            let b_total = estimated_cost(b_median_run);
-            let g_total = estimated_cost(g_median_run);
+            let median_keys = [Metric::EstimatedCost, Metric::ContextTokens];
+            let [b_median_run, b_median_ctx] = find_median_runs(baseline, median_keys);
+            let [g_median_run, g_median_ctx] = find_median_runs(glean, median_keys);
+            let b_costs = b_median_run.cost_breakdown();
+            let g_costs = g_median_run.cost_breakdown();
+            let b_total = b_costs.total();
+            let g_total = g_costs.total();
             let total_delta = g_total - b_total;
-            let b_turns = get_u64(b_median_run, "num_turns");
-            let g_turns = get_u64(g_median_run, "num_turns");
+            let b_turns = b_median_run.num_turns;
+            let g_turns = g_median_run.num_turns;
             let turns_delta = g_turns as i64 - b_turns as i64;
-            let b_correct_str = if get_bool(b_median_run, "correct") {
+            let b_correct_str = if b_median_run.correct {
                 "correct"
             } else {
                 "incorrect"
             };
-            let g_correct_str = if get_bool(g_median_run, "correct") {
+            let g_correct_str = if g_median_run.correct {
                 "correct"
             } else {
                 "incorrect"
             };
 
-            lines.push("**Cost breakdown (median run):**".into());
-            lines.push(String::new());
-            lines.push(format!(
+            writeln!(out, "**Cost breakdown (median run):**")?;
+            writeln!(out)?;
+            writeln!(
+                out,
                 "  baseline: {b_turns} turns, ${b_total:.2}, {b_correct_str}"
-            ));
-            lines.push(format_cost_breakdown(&b_costs));
-            lines.push(format!(
+            )?;
+            write_cost_breakdown(out, &b_costs)?;
+            writeln!(
+                out,
                 "  glean:    {g_turns} turns, ${g_total:.2}, {g_correct_str}"
-            ));
-            lines.push(format_cost_breakdown(&g_costs));
-            lines.push(format!(
+            )?;
+            write_cost_breakdown(out, &g_costs)?;
+            writeln!(
+                out,
                 "  delta:    {:+} turns, {:+.2}",
                 turns_delta, total_delta
-            ));
-            lines.push(format_cost_delta(&b_costs, &g_costs));
-            lines.push(String::new());
+            )?;
+            write_cost_delta(out, &b_costs, &g_costs)?;
+            writeln!(out)?;
 
             // Per-turn sparklines
-            let b_median_ctx = find_median_run(baseline_runs, "context_tokens");
-            let g_median_ctx = find_median_run(glean_runs, "context_tokens");
-            let b_per_turn: Vec<u64> = b_median_ctx
-                .get("per_turn_context_tokens")
-                .and_then(Value::as_array)
-                .map(|a| a.iter().filter_map(Value::as_u64).collect())
-                .unwrap_or_default();
-            let g_per_turn: Vec<u64> = g_median_ctx
-                .get("per_turn_context_tokens")
-                .and_then(Value::as_array)
-                .map(|a| a.iter().filter_map(Value::as_u64).collect())
-                .unwrap_or_default();
+            let b_per_turn = &b_median_ctx.per_turn_context_tokens;
+            let g_per_turn = &g_median_ctx.per_turn_context_tokens;
 
             if !b_per_turn.is_empty() && !g_per_turn.is_empty() {
-                lines.push("**Per-turn context tokens (median run):**".into());
-                lines.push(String::new());
-                let b_spark = ascii_sparkline(&b_per_turn);
-                let g_spark = ascii_sparkline(&g_per_turn);
+                writeln!(out, "**Per-turn context tokens (median run):**")?;
+                writeln!(out)?;
+                let b_spark = ascii_sparkline(b_per_turn);
+                let g_spark = ascii_sparkline(g_per_turn);
                 let b_min = b_per_turn.iter().min().unwrap();
                 let b_max = b_per_turn.iter().max().unwrap();
                 let g_min = g_per_turn.iter().min().unwrap();
                 let g_max = g_per_turn.iter().max().unwrap();
-                lines.push(format!("  baseline: {b_spark} ({b_min} \u{2192} {b_max})"));
-                lines.push(format!("  glean:    {g_spark} ({g_min} \u{2192} {g_max})"));
-                lines.push(String::new());
+                writeln!(out, "  baseline: {b_spark} ({b_min} \u{2192} {b_max})")?;
+                writeln!(out, "  glean:    {g_spark} ({g_min} \u{2192} {g_max})")?;
+                writeln!(out)?;
             }
 
             // Tool breakdown
-            let b_tools = merge_tool_calls(baseline_runs);
-            let g_tools = merge_tool_calls(glean_runs);
+            let b_tools = merge_tool_calls(&baseline.runs);
+            let g_tools = merge_tool_calls(&glean.runs);
             if !b_tools.is_empty() || !g_tools.is_empty() {
-                lines.push("**Tool breakdown (median counts):**".into());
-                lines.push(String::new());
+                writeln!(out, "**Tool breakdown (median counts):**")?;
+                writeln!(out)?;
                 if !b_tools.is_empty() {
-                    let strs: Vec<String> =
-                        b_tools.iter().map(|(k, v)| format!("{k}={v:.0}")).collect();
-                    lines.push(format!("  baseline: {}", strs.join(", ")));
+                    writeln!(out, "{}", format_tool_counts("  baseline: ", &b_tools))?;
                 }
                 if !g_tools.is_empty() {
-                    let strs: Vec<String> =
-                        g_tools.iter().map(|(k, v)| format!("{k}={v:.0}")).collect();
-                    lines.push(format!("  glean:    {}", strs.join(", ")));
+                    writeln!(out, "{}", format_tool_counts("  glean:    ", &g_tools))?;
                 }
-                lines.push(String::new());
+                writeln!(out)?;
             }
         } else {
             // Only one mode available
-            for &mode_name in &all_modes {
-                let mode_results = match mode_groups.get(mode_name) {
-                    Some(v) => v,
-                    None => continue,
+            for &mode_name in &scan.modes {
+                let Some(bucket) = mode_groups.get(mode_name) else {
+                    continue;
                 };
 
-                lines.push(format!("**Mode: {mode_name}**"));
-                lines.push(String::new());
-                lines.push("| Metric | Median |".into());
-                lines.push("|--------|--------|".into());
-
-                let metrics: &[(&str, &str)] = &[
-                    ("Context tokens", "context_tokens"),
-                    ("Output tokens", "output_tokens"),
-                    ("Turns", "num_turns"),
-                    ("Tool calls", "num_tool_calls"),
-                    ("Est. cost", "estimated_cost"),
-                    ("Duration ms", "duration_ms"),
+                writeln!(out, "**Mode: {mode_name}**")?;
+                writeln!(out)?;
+                writeln!(out, "| Metric | Median |")?;
+                writeln!(out, "|--------|--------|")?;
+
+                let metrics: &[(&str, Metric)] = &[
+                    ("Context tokens", Metric::ContextTokens),
+                    ("Output tokens", Metric::OutputTokens),
+                    ("Turns", Metric::Turns),
+                    ("Tool calls", Metric::ToolCalls),
+                    ("Est. cost", Metric::EstimatedCost),
+                    ("Duration ms", Metric::DurationMs),
                 ];
 
-                for &(label, key) in metrics {
-                    let is_cost = key == "estimated_cost";
-                    let vals: Vec<f64> = if is_cost {
-                        mode_results.iter().map(|r| estimated_cost(r)).collect()
-                    } else {
-                        mode_results.iter().map(|r| get_f64(r, key)).collect()
-                    };
-                    let stats = compute_stats(&vals);
+                for &(label, metric) in metrics {
+                    let is_cost = metric == Metric::EstimatedCost;
+                    let stats = bucket.stats(metric);
                     let fmt = if is_cost {
                         format!("${:.4}", stats.median)
                     } else {
                         format!("{:.0}", stats.median)
                     };
-                    lines.push(format!("| {label} | {fmt} |"));
+                    writeln!(out, "| {label} | {fmt} |")?;
                 }
 
-                let correct = mode_results
-                    .iter()
-                    .filter(|r| get_bool(r, "correct"))
-                    .count();
-                let pct = correct as f64 / mode_results.len() as f64 * 100.0;
-                lines.push(format!("| Correctness | {pct:.0}% |"));
-                lines.push(String::new());
+                let pct = bucket.correct_pct();
+                writeln!(out, "| Correctness | {pct:.0}% |")?;
+                writeln!(out)?;
             }
         }
-        lines.push(String::new());
     }
 
-    // Summary section
-    let baseline_all: Vec<&Value> = valid
-        .iter()
-        .filter(|r| get_str(r, "mode") == "baseline")
-        .copied()
+    // Summary section: per-task buckets are shared by every metric below.
+    let baseline_by_task: Vec<&ModeRuns> = scan
+        .by_task
+        .values()
+        .filter_map(|t| t.modes.get("baseline"))
         .collect();
-    let glean_all: Vec<&Value> = valid
-        .iter()
-        .filter(|r| get_str(r, "mode") == "glean")
-        .copied()
+    let glean_by_task: Vec<&ModeRuns> = scan
+        .by_task
+        .values()
+        .filter_map(|t| t.modes.get("glean"))
         .collect();
 
-    if !baseline_all.is_empty() && !glean_all.is_empty() {
-        lines.push("## Summary".into());
-        lines.push(String::new());
-        lines.push("Averaged across all tasks (median of medians):".into());
-        lines.push(String::new());
-        lines.push("| Metric | baseline | glean | Improvement |".into());
-        lines.push("|--------|----------|-------|-------------|".into());
-
-        let metrics: &[(&str, &str)] = &[
-            ("Context tokens", "context_tokens"),
-            ("Turns", "num_turns"),
-            ("Tool calls", "num_tool_calls"),
-            ("Est. cost", "estimated_cost"),
+    if !baseline_by_task.is_empty() && !glean_by_task.is_empty() {
+        if wrote_task {
+            writeln!(out)?;
+        }
+        writeln!(out, "## Summary")?;
+        writeln!(out)?;
+        writeln!(out, "Averaged across all tasks (median of medians):")?;
+        writeln!(out)?;
+        writeln!(out, "| Metric | baseline | glean | Improvement |")?;
+        writeln!(out, "|--------|----------|-------|-------------|")?;
+
+        let metrics: &[(&str, Metric)] = &[
+            ("Context tokens", Metric::ContextTokens),
+            ("Turns", Metric::Turns),
+            ("Tool calls", Metric::ToolCalls),
+            ("Est. cost", Metric::EstimatedCost),
         ];
 
-        for &(label, key) in metrics {
-            let is_cost = key == "estimated_cost";
-            let b_by_task = {
-                let mut m: HashMap<&str, Vec<f64>> = HashMap::new();
-                for r in &baseline_all {
-                    let val = if is_cost {
-                        estimated_cost(r)
-                    } else {
-                        get_f64(r, key)
-                    };
-                    m.entry(get_str(r, "task")).or_default().push(val);
-                }
-                m
-            };
-            let g_by_task = {
-                let mut m: HashMap<&str, Vec<f64>> = HashMap::new();
-                for r in &glean_all {
-                    let val = if is_cost {
-                        estimated_cost(r)
-                    } else {
-                        get_f64(r, key)
-                    };
-                    m.entry(get_str(r, "task")).or_default().push(val);
-                }
-                m
-            };
-
-            let b_medians: Vec<f64> = b_by_task
-                .values()
-                .map(|v| compute_stats(v).median)
+        for &(label, metric) in metrics {
+            let is_cost = metric == Metric::EstimatedCost;
+            let mut b_medians: Vec<f64> = baseline_by_task
+                .iter()
+                .map(|m| m.stats(metric).median)
                 .collect();
-            let g_medians: Vec<f64> = g_by_task
-                .values()
-                .map(|v| compute_stats(v).median)
+            let mut g_medians: Vec<f64> = glean_by_task
+                .iter()
+                .map(|m| m.stats(metric).median)
                 .collect();
 
-            if !b_medians.is_empty() && !g_medians.is_empty() {
-                let b_val = compute_stats(&b_medians).median;
-                let g_val = compute_stats(&g_medians).median;
-                let improvement = format_delta(b_val, g_val);
+            let b_val = compute_stats(&mut b_medians).median;
+            let g_val = compute_stats(&mut g_medians).median;
+            let improvement = format_delta(b_val, g_val);
 
-                let (b_fmt, g_fmt) = if is_cost {
-                    (format!("${b_val:.4}"), format!("${g_val:.4}"))
-                } else {
-                    (format!("{b_val:.0}"), format!("{g_val:.0}"))
-                };
+            let (b_fmt, g_fmt) = if is_cost {
+                (format!("${b_val:.4}"), format!("${g_val:.4}"))
+            } else {
+                (format!("{b_val:.0}"), format!("{g_val:.0}"))
+            };
 
-                lines.push(format!("| {label} | {b_fmt} | {g_fmt} | {improvement} |"));
-            }
+            writeln!(out, "| {label} | {b_fmt} | {g_fmt} | {improvement} |")?;
         }
-
-        lines.push(String::new());
     }
 
-    lines.join("\n")
+    Ok(())
 }
 
+/// Write buffer for the report. A report runs to a few KiB per task, so this
+/// holds most reports whole and flushes them with a handful of writes rather
+/// than one per default-sized (8 KiB) buffer.
+const REPORT_BUF_BYTES: usize = 64 * 1024;
+
 pub fn analyze(results_path: &Path, output_path: Option<&Path>) {
     if !results_path.exists() {
         eprintln!("ERROR: File not found: {}", results_path.display());
@@ -602,15 +671,62 @@ pub fn analyze(results_path: &Path, output_path: Option<&Path>) {
     }
 
     let results = load_results(results_path);
-    let report = generate_report(&results);
 
     if let Some(out) = output_path {
         if let Some(parent) = out.parent() {
             fs::create_dir_all(parent).ok();
         }
-        fs::write(out, &report).expect("Failed to write report");
+        let file = File::create(out).expect("Failed to write report");
+        let mut writer = BufWriter::with_capacity(REPORT_BUF_BYTES, file);
+        write_report(&results, &mut writer)
+            .and_then(|()| writer.flush())
+            .expect("Failed to write report");
         println!("Report written to: {}", out.display());
     } else {
-        println!("{report}");
+        let mut writer = BufWriter::with_capacity(REPORT_BUF_BYTES, io::stdout().lock());
+        write_report(&results, &mut writer)
+            .and_then(|()| writeln!(writer))
+            .and_then(|()| writer.flush())
+            .expect("Failed to write report");
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    /// Render the report for `jsonl` into memory.
+    fn report_for(name: &str, jsonl: &str) -> Vec<u8> {
+        let path = std::env::temp_dir().join(format!(
+            "glean-bench-report-{name}-{}.jsonl",
+            std::process::id()
+        ));
+        fs::write(&path, jsonl).unwrap();
+        let results = load_results(&path);
+        fs::remove_file(&path).unwrap();
+        let mut out = Vec::new();
+        write_report(&results, &mut out).unwrap();
+        out
+    }
+
+    #[test]
+    fn report_ends_with_single_newline() {
+        let summary = report_for(
+            "summary",
+            concat!(
+                r#"{"task":"a","mode":"baseline","model":"sonnet","repetition":0,"num_turns":5}"#,
+                "\n",
+                r#"{"task":"a","mode":"glean","model":"sonnet","repetition":0,"num_turns":3}"#,
+                "\n",
+            ),
+        );
+        let summary = String::from_utf8(summary).unwrap();
+        assert!(summary.ends_with(" |\n"), "{summary:?}");
+
+        let failed = report_for("failed", "{\"task\":\"a\",\"error\":\"timeout\"}\n");
+        assert!(failed.ends_with(b"All 1 runs failed.\n"));
+
+        let empty = report_for("empty", "");
+        assert!(empty.ends_with(b"No valid results found in file.\n"));
     }
 }
@@ -1,35 +1,61 @@
-use crate::analyze::load_results;
-use crate::json_helpers::{get_bool, get_str, get_u64};
-use serde_json::Value;
-use std::collections::HashMap;
+use crate::results::{Run, load_valid_results};
+use std::collections::{BTreeMap, HashMap};
+use std::io::{self, BufWriter, Write};
 use std::path::Path;
+use std::thread;
+
+/// Everything the summary and tool-mix tables need from one file's glean
+/// sonnet runs, accumulated in a single pass.
+#[derive(Default)]
+struct Totals<'a> {
+    runs: usize,
+    turns: u64,
+    tool_calls: u64,
+    correct: usize,
+    tools: HashMap<&'a str, u64>,
+}
 
-fn avg(runs: &[&Value], key: &str) -> f64 {
-    if runs.is_empty() {
-        return 0.0;
+impl<'a> Totals<'a> {
+    fn of(runs: &'a [Run]) -> Self {
+        let mut t = Totals::default();
+        for r in runs
+            .iter()
+            .filter(|r| &*r.mode == "glean" && &*r.model == "sonnet")
+        {
+            t.runs += 1;
+            t.turns += r.num_turns;
+            t.tool_calls += r.num_tool_calls;
+            t.correct += usize::from(r.correct);
+            for (tool, &count) in &r.tool_calls {
+                *t.tools.entry(tool.as_str()).or_insert(0) += count;
+            }
+        }
+        t
     }
-    let vals: Vec<f64> = runs
-        .iter()
-        .filter_map(|r| r.get(key).and_then(Value::as_f64))
-        .collect();
-    if vals.is_empty() {
-        return 0.0;
+
+    fn avg(&self, sum: u64) -> f64 {
+        if self.runs == 0 {
+            return 0.0;
+        }
+        sum as f64 / self.runs as f64
     }
-    vals.iter().sum::<f64>() / vals.len() as f64
 }
 
-fn group_by_task_mode<'a>(runs: &'a [&Value]) -> HashMap<(String, String), Vec<&'a Value>> {
-    let mut groups: HashMap<(String, String), Vec<&Value>> = HashMap::new();
-    for r in runs {
-        let key = (
-            get_str(r, "task").to_string(),
-            get_str(r, "mode").to_string(),
-        );
-        groups.entry(key).or_default().push(r);
+/// Group the glean-mode runs by task, in task order. Only glean runs are
+/// compared run by run, so other modes are never bucketed.
+fn glean_runs_by_task(runs: &[Run]) -> BTreeMap<&str, Vec<&Run>> {
+    let mut groups: BTreeMap<&str, Vec<&Run>> = BTreeMap::new();
+    for r in runs.iter().filter(|r| &*r.mode == "glean") {
+        groups.entry(&*r.task).or_default().push(r);
     }
     groups
 }
 
+/// Render a run's tool counts the way they appear in the results file.
+fn tool_calls_json(run: &Run) -> String {
+    serde_json::to_string(&run.tool_calls).unwrap_or_default()
+}
+
 pub fn compare(old_path: &Path, new_path: &Path) {
     if !old_path.exists() {
         eprintln!("ERROR: File not found: {}", old_path.display());
@@ -40,88 +66,80 @@ pub fn compare(old_path: &Path, new_path: &Path) {
         std::process::exit(1);
     }
 
-    let old_results = load_results(old_path);
-    let new_results = load_results(new_path);
-
-    let old_valid: Vec<&Value> = old_results
-        .iter()
-        .filter(|r| r.get("error").is_none())
-        .collect();
-    let new_valid: Vec<&Value> = new_results
-        .iter()
-        .filter(|r| r.get("error").is_none())
-        .collect();
-
-    println!("{}", "=".repeat(80));
-    println!("OLD vs NEW COMPARISON");
-    println!("{}", "=".repeat(80));
-    println!();
-    println!("Old file: {}", old_path.display());
-    println!("New file: {}", new_path.display());
+    // The two files are independent, so parse them on separate cores.
+    // Errored runs are never compared, so they are dropped unparsed.
+    let (old_valid, new_valid) = thread::scope(|s| {
+        let old = s.spawn(|| load_valid_results(old_path));
+        let new = load_valid_results(new_path);
+        (old.join().expect("results loader thread panicked"), new)
+    });
+
+    let mut writer = BufWriter::new(io::stdout().lock());
+    write_comparison(old_path, new_path, &old_valid, &new_valid, &mut writer)
+        .and_then(|()| writer.flush())
+        .expect("Failed to write comparison");
+}
 
-    let old_groups = group_by_task_mode(&old_valid);
-    let new_groups = group_by_task_mode(&new_valid);
+/// Write the old-vs-new comparison to `out`, line by line.
+fn write_comparison(
+    old_path: &Path,
+    new_path: &Path,
+    old_valid: &[Run],
+    new_valid: &[Run],
+    out: &mut impl Write,
+) -> io::Result<()> {
+    writeln!(out, "{}", "=".repeat(80))?;
+    writeln!(out, "OLD vs NEW COMPARISON")?;
+    writeln!(out, "{}", "=".repeat(80))?;
+    writeln!(out)?;
+    writeln!(out, "Old file: {}", old_path.display())?;
+    writeln!(out, "New file: {}", new_path.display())?;
+
+    let old_groups = glean_runs_by_task(old_valid);
+    let new_groups = glean_runs_by_task(new_valid);
 
     // Compare glean runs
-    println!();
-    println!("{}", "=".repeat(80));
-    println!("GLEAN MODE COMPARISON");
-    println!("{}", "=".repeat(80));
-
-    let mut all_tasks: Vec<String> = old_groups
-        .keys()
-        .filter(|(_, m)| m == "glean")
-        .map(|(t, _)| t.clone())
-        .collect();
-    all_tasks.sort();
-    all_tasks.dedup();
-
-    for task in &all_tasks {
-        let old_glean = old_groups
-            .get(&(task.clone(), "glean".into()))
-            .cloned()
-            .unwrap_or_default();
-        let new_glean = new_groups
-            .get(&(task.clone(), "glean".into()))
-            .cloned()
-            .unwrap_or_default();
-
-        if old_glean.is_empty() || new_glean.is_empty() {
+    writeln!(out)?;
+    writeln!(out, "{}", "=".repeat(80))?;
+    writeln!(out, "GLEAN MODE COMPARISON")?;
+    writeln!(out, "{}", "=".repeat(80))?;
+
+    for (&task, old_glean) in &old_groups {
+        let Some(new_glean) = new_groups.get(task) else {
             continue;
-        }
+        };
 
-        println!();
-        println!("{}", "=".repeat(80));
-        println!("Task: {task}");
-        println!("{}", "=".repeat(80));
+        writeln!(out)?;
+        writeln!(out, "{}", "=".repeat(80))?;
+        writeln!(out, "Task: {task}")?;
+        writeln!(out, "{}", "=".repeat(80))?;
 
         for (old, new) in old_glean.iter().zip(new_glean.iter()) {
-            println!();
-            println!("OLD: {}", get_str(old, "glean_version"));
-            println!(
+            writeln!(out)?;
+            writeln!(out, "OLD: {}", old.glean_version.as_deref().unwrap_or(""))?;
+            writeln!(
+                out,
                 "  Turns: {}, Tool calls: {}",
-                get_u64(old, "num_turns"),
-                get_u64(old, "num_tool_calls")
-            );
-            println!("  Tools: {}", old.get("tool_calls").unwrap_or(&Value::Null));
-            println!("  Correct: {}", get_bool(old, "correct"));
-
-            println!();
-            println!("NEW: {}", get_str(new, "glean_version"));
-            println!(
+                old.num_turns, old.num_tool_calls
+            )?;
+            writeln!(out, "  Tools: {}", tool_calls_json(old))?;
+            writeln!(out, "  Correct: {}", old.correct)?;
+
+            writeln!(out)?;
+            writeln!(out, "NEW: {}", new.glean_version.as_deref().unwrap_or(""))?;
+            writeln!(
+                out,
                 "  Turns: {}, Tool calls: {}",
-                get_u64(new, "num_turns"),
-                get_u64(new, "num_tool_calls")
-            );
-            println!("  Tools: {}", new.get("tool_calls").unwrap_or(&Value::Null));
-            println!("  Correct: {}", get_bool(new, "correct"));
-
-            let turn_delta = get_u64(new, "num_turns") as i64 - get_u64(old, "num_turns") as i64;
-            let tool_delta =
-                get_u64(new, "num_tool_calls") as i64 - get_u64(old, "num_tool_calls") as i64;
-
-            println!();
-            println!("DELTA:");
+                new.num_turns, new.num_tool_calls
+            )?;
+            writeln!(out, "  Tools: {}", tool_calls_json(new))?;
+            writeln!(out, "  Correct: {}", new.correct)?;
+
+            let turn_delta = new.num_turns as i64 - old.num_turns as i64;
+            let tool_delta = new.num_tool_calls as i64 - old.num_tool_calls as i64;
+
+            writeln!(out)?;
+            writeln!(out, "DELTA:")?;
             let turn_desc = if turn_delta > 0 {
                 "more"
             } else if turn_delta < 0 {
@@ -136,108 +154,100 @@ pub fn compare(old_path: &Path, new_path: &Path) {
             } else {
                 "same"
             };
-            println!("  Turns: {turn_delta:+} ({turn_desc})");
-            println!("  Tool calls: {tool_delta:+} ({tool_desc})");
-            println!(
+            writeln!(out, "  Turns: {turn_delta:+} ({turn_desc})")?;
+            writeln!(out, "  Tool calls: {tool_delta:+} ({tool_desc})")?;
+            writeln!(
+                out,
                 "  Correctness: {}",
-                if get_bool(old, "correct") == get_bool(new, "correct") {
+                if old.correct == new.correct {
                     "same"
                 } else {
                     "CHANGED"
                 }
-            );
+            )?;
         }
     }
 
     // Summary statistics
-    println!();
-    println!("{}", "=".repeat(80));
-    println!("SUMMARY STATISTICS");
-    println!("{}", "=".repeat(80));
-
-    let old_glean_sonnet: Vec<&Value> = old_valid
-        .iter()
-        .filter(|r| get_str(r, "mode") == "glean" && get_str(r, "model") == "sonnet")
-        .copied()
-        .collect();
-    let new_glean_sonnet: Vec<&Value> = new_valid
-        .iter()
-        .filter(|r| get_str(r, "mode") == "glean" && get_str(r, "model") == "sonnet")
-        .copied()
-        .collect();
-
-    println!();
-    println!(
+    writeln!(out)?;
+    writeln!(out, "{}", "=".repeat(80))?;
+    writeln!(out, "SUMMARY STATISTICS")?;
+    writeln!(out, "{}", "=".repeat(80))?;
+
+    let old_totals = Totals::of(old_valid);
+    let new_totals = Totals::of(new_valid);
+
+    writeln!(out)?;
+    writeln!(
+        out,
         "{:<30} {:>20} {:>20} {:>15}",
         "Metric", "Old", "New", "Delta"
-    );
-    println!("{}", "-".repeat(90));
+    )?;
+    writeln!(out, "{}", "-".repeat(90))?;
 
     let metrics = [
-        ("num_turns", "Avg turns"),
-        ("num_tool_calls", "Avg tool calls"),
+        ("Avg turns", old_totals.turns, new_totals.turns),
+        (
+            "Avg tool calls",
+            old_totals.tool_calls,
+            new_totals.tool_calls,
+        ),
     ];
-    for (key, label) in &metrics {
-        let old_avg = avg(&old_glean_sonnet, key);
-        let new_avg = avg(&new_glean_sonnet, key);
+    for (label, old_sum, new_sum) in metrics {
+        let old_avg = old_totals.avg(old_sum);
+        let new_avg = new_totals.avg(new_sum);
         let delta = new_avg - old_avg;
-        println!("{label:<30} {old_avg:>20.2} {new_avg:>20.2} {delta:>15.2}");
+        writeln!(
+            out,
+            "{label:<30} {old_avg:>20.2} {new_avg:>20.2} {delta:>15.2}"
+        )?;
     }
 
     // Correctness
-    let old_correct = old_glean_sonnet
-        .iter()
-        .filter(|r| get_bool(r, "correct"))
-        .count();
-    let new_correct = new_glean_sonnet
-        .iter()
-        .filter(|r| get_bool(r, "correct"))
-        .count();
-    println!();
-    println!(
+    let old_correct = old_totals.correct;
+    let new_correct = new_totals.correct;
+    writeln!(out)?;
+    writeln!(
+        out,
         "{:<30} {:>17}/{} {:>17}/{} {:>15}",
         "Correctness",
         old_correct,
-        old_glean_sonnet.len(),
+        old_totals.runs,
         new_correct,
-        new_glean_sonnet.len(),
+        new_totals.runs,
         new_correct as i64 - old_correct as i64
-    );
+    )?;
 
     // Tool mix
-    println!();
-    println!("{}", "=".repeat(80));
-    println!("TOOL MIX ANALYSIS");
-    println!("{}", "=".repeat(80));
-
-    fn count_tools(runs: &[&Value]) -> HashMap<String, u64> {
-        let mut counts: HashMap<String, u64> = HashMap::new();
-        for r in runs {
-            if let Some(tc) = r.get("tool_calls").and_then(Value::as_object) {
-                for (tool, count) in tc {
-                    *counts.entry(tool.clone()).or_insert(0) += count.as_u64().unwrap_or(0);
-                }
-            }
-        }
-        counts
-    }
+    writeln!(out)?;
+    writeln!(out, "{}", "=".repeat(80))?;
+    writeln!(out, "TOOL MIX ANALYSIS")?;
+    writeln!(out, "{}", "=".repeat(80))?;
 
-    let old_tools = count_tools(&old_glean_sonnet);
-    let new_tools = count_tools(&new_glean_sonnet);
+    let old_tools = &old_totals.tools;
+    let new_tools = &new_totals.tools;
 
-    let mut all_tool_names: Vec<String> =
-        old_tools.keys().chain(new_tools.keys()).cloned().collect();
-    all_tool_names.sort();
+    let mut all_tool_names: Vec<&str> = old_tools.keys().chain(new_tools.keys()).copied().collect();
+    all_tool_names.sort_unstable();
     all_tool_names.dedup();
 
-    println!();
-    println!("{:<40} {:>15} {:>15} {:>15}", "Tool", "Old", "New", "Delta");
-    println!("{}", "-".repeat(90));
+    writeln!(out)?;
+    writeln!(
+        out,
+        "{:<40} {:>15} {:>15} {:>15}",
+        "Tool", "Old", "New", "Delta"
+    )?;
+    writeln!(out, "{}", "-".repeat(90))?;
 
     for tool in &all_tool_names {
         let old_count = old_tools.get(tool).copied().unwrap_or(0);
         let new_count = new_tools.get(tool).copied().unwrap_or(0);
         let delta = new_count as i64 - old_count as i64;
-        println!("{tool:<40} {old_count:>15} {new_count:>15} {delta:>15}");
+        writeln!(
+            out,
+            "{tool:<40} {old_count:>15} {new_count:>15} {delta:>15}"
+        )?;
     }
+
+    Ok(())
 }
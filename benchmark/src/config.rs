@@ -1,19 +1,24 @@
 use std::collections::HashMap;
 use std::path::{Path, PathBuf};
+use std::sync::LazyLock;
 
-/// Model name → API model ID.
-pub fn models() -> HashMap<&'static str, &'static str> {
+static MODELS: LazyLock<HashMap<&str, &str>> = LazyLock::new(|| {
     HashMap::from([
         ("haiku", "claude-haiku-4-5-20251001"),
         ("sonnet", "claude-sonnet-4-5-20250929"),
         ("opus", "claude-opus-4-6"),
     ])
+});
+
+/// Model name → API model ID. Built once and shared.
+pub fn models() -> &'static HashMap<&'static str, &'static str> {
+    &MODELS
 }
 
 #[expect(dead_code)]
 pub struct ModeConfig {
     pub name: &'static str,
-    pub tools: Vec<&'static str>,
+    pub tools: &'static [&'static str],
     pub mcp_config_path: Option<PathBuf>,
     pub description: &'static str,
 }
@@ -25,7 +30,7 @@ pub fn modes(benchmark_dir: &Path) -> HashMap<&'static str, ModeConfig> {
             "baseline",
             ModeConfig {
                 name: "baseline",
-                tools: vec!["Read", "Edit", "Grep", "Glob", "Bash"],
+                tools: &["Read", "Edit", "Grep", "Glob", "Bash"],
                 mcp_config_path: None,
                 description: "Claude Code built-in tools",
             },
@@ -34,7 +39,7 @@ pub fn modes(benchmark_dir: &Path) -> HashMap<&'static str, ModeConfig> {
             "glean",
             ModeConfig {
                 name: "glean",
-                tools: vec!["Read", "Edit", "Grep", "Glob", "Bash"],
+                tools: &["Read", "Edit", "Grep", "Glob", "Bash"],
                 mcp_config_path: Some(glean_mcp.clone()),
                 description: "Built-in tools + glean MCP (hybrid)",
             },
@@ -43,7 +48,7 @@ pub fn modes(benchmark_dir: &Path) -> HashMap<&'static str, ModeConfig> {
             "glean_forced",
             ModeConfig {
                 name: "glean_forced",
-                tools: vec!["Read", "Edit"],
+                tools: &["Read", "Edit"],
                 mcp_config_path: Some(glean_mcp),
                 description: "glean MCP only (no Bash/Grep/Glob)",
             },
@@ -66,7 +71,7 @@ impl RepoConfig {
     }
 }
 
-pub fn repos() -> HashMap<&'static str, RepoConfig> {
+static REPOS: LazyLock<HashMap<&str, RepoConfig>> = LazyLock::new(|| {
     HashMap::from([
         (
             "ripgrep",
@@ -109,6 +114,12 @@ pub fn repos() -> HashMap<&'static str, RepoConfig> {
             },
         ),
     ])
+});
+
+/// Repo name → pinned checkout. Built once and shared, since every run looks
+/// up its task's repo here.
+pub fn repos() -> &'static HashMap<&'static str, RepoConfig> {
+    &REPOS
 }
 
 pub const SYSTEM_PROMPT: &str = "You are a code assistant. Answer the user's question about the codebase in the current directory.\nUse the tools available to you to explore and understand the code.\nBe precise and show relevant code when asked.";
@@ -71,5 +71,6 @@ pub fn eval(
         &eval_tasks,
         Some(&output_path),
         Some(EVAL_MAX_BUDGET_USD),
+        1,
     );
 }
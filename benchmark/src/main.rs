@@ -4,12 +4,15 @@ mod config;
 mod eval;
 mod json_helpers;
 mod parse;
+mod results;
 mod run;
 mod setup;
 mod task;
 mod tasks;
+mod text;
 
 use clap::{Parser, Subcommand};
+use std::num::NonZeroUsize;
 use std::path::PathBuf;
 
 #[derive(Parser)]
@@ -47,6 +50,11 @@ enum Commands {
         /// Write results to this file instead of auto-generating a timestamped name
         #[arg(short, long)]
         output: Option<PathBuf>,
+        /// Number of repos to benchmark concurrently (runs on one repo stay serial).
+        /// Concurrent runs contend for CPU and API rate limits, so their durations
+        /// are not comparable with serial (--workers 1) runs
+        #[arg(long, default_value_t = NonZeroUsize::MIN)]
+        workers: NonZeroUsize,
     },
     /// Run fast eval tasks against mini fixtures
     Eval {
@@ -89,6 +97,10 @@ enum Commands {
         /// Clone real-world repos at pinned commits
         #[arg(long)]
         repos: bool,
+        /// Make blobless partial clones (faster setup; git history commands
+        /// then fetch from the network mid-run, so results are not comparable)
+        #[arg(long)]
+        partial_clone: bool,
     },
 }
 
@@ -105,6 +117,7 @@ fn main() {
             verbose,
             retry,
             output,
+            workers,
         } => {
             let all_tasks = tasks::all_tasks();
 
@@ -149,6 +162,7 @@ fn main() {
                     &all_tasks,
                     output.as_deref(),
                     None,
+                    workers.get(),
                 );
             }
         }
@@ -178,13 +192,16 @@ fn main() {
         Commands::Compare { old, new } => {
             compare::compare(&old, &new);
         }
-        Commands::Setup { repos } => {
+        Commands::Setup {
+            repos,
+            partial_clone,
+        } => {
             if !repos {
                 println!("Specify --repos to clone real-world repos at pinned commits");
                 println!("  bench setup --repos");
                 std::process::exit(1);
             }
-            setup::setup_repos();
+            setup::setup_repos(partial_clone);
         }
     }
 }
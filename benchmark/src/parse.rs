@@ -1,11 +1,13 @@
-use serde_json::Value;
+use crate::text::Interner;
+use serde_json::{Map, Value};
 use std::collections::HashMap;
+use std::sync::Arc;
 
 /// A single tool invocation.
 #[expect(dead_code)]
 pub struct ToolCall {
-    pub name: String,
-    pub input: HashMap<String, Value>,
+    pub name: Arc<str>,
+    pub input: Map<String, Value>,
     pub tool_use_id: String,
     pub turn_index: usize,
 }
@@ -50,68 +52,83 @@ pub struct RunResult {
     pub correctness_reason: String,
 }
 
-/// Parse newline-delimited JSON output from `claude -p --output-format stream-json --verbose`.
-pub fn parse_stream_json(raw_output: &str) -> RunResult {
-    let mut session_id = String::new();
-    let mut turns: Vec<Turn> = Vec::new();
-    let mut all_text_parts: Vec<String> = Vec::new();
-    let mut final_summary = Value::Null;
-    let mut turn_index: usize = 0;
+/// Take the string at `key` out of `value`, or an empty string if absent.
+fn take_string(value: &mut Value, key: &str) -> String {
+    match value.get_mut(key).map(Value::take) {
+        Some(Value::String(s)) => s,
+        _ => String::new(),
+    }
+}
+
+/// Incremental parser for newline-delimited JSON output from
+/// `claude -p --output-format stream-json --verbose`.
+///
+/// Lines are fed in as they arrive on claude's stdout, so the stream is
+/// never held in memory as a whole; the pieces we keep are moved out of
+/// each parsed event rather than cloned.
+#[derive(Default)]
+pub struct StreamParser {
+    session_id: String,
+    turns: Vec<Turn>,
+    all_text_parts: Vec<String>,
+    final_summary: Value,
+    /// Tool names come from a small fixed vocabulary, so every call to the
+    /// same tool shares one allocation.
+    tool_names: Interner,
+}
 
-    for line in raw_output.lines() {
-        let line = line.trim();
+impl StreamParser {
+    /// Consume one line of output. Blank and malformed lines are skipped.
+    pub fn push_line(&mut self, line: &[u8]) {
+        let line = line.trim_ascii();
         if line.is_empty() {
-            continue;
+            return;
         }
-        let event: Value = match serde_json::from_str(line) {
+        let mut event: Value = match serde_json::from_slice(line) {
             Ok(v) => v,
-            Err(_) => continue,
+            Err(_) => return,
         };
+        let turn_index = self.turns.len();
 
         match event.get("type").and_then(Value::as_str) {
             Some("system") => {
                 if let Some(sid) = event.get("session_id").and_then(Value::as_str) {
-                    session_id = sid.to_string();
+                    self.session_id = sid.to_string();
                 }
             }
             Some("assistant") => {
-                let message = event.get("message").cloned().unwrap_or(Value::Null);
-                let usage = message.get("usage").cloned().unwrap_or(Value::Null);
-                let content_blocks = message
-                    .get("content")
-                    .and_then(Value::as_array)
-                    .cloned()
+                let mut message = event
+                    .get_mut("message")
+                    .map(Value::take)
                     .unwrap_or_default();
+                let content_blocks = match message.get_mut("content").map(Value::take) {
+                    Some(Value::Array(blocks)) => blocks,
+                    _ => Vec::new(),
+                };
+                let usage = &message["usage"];
 
                 let mut tool_calls = Vec::new();
                 let mut text_blocks: Vec<String> = Vec::new();
 
-                for block in &content_blocks {
+                for mut block in content_blocks {
                     match block.get("type").and_then(Value::as_str) {
                         Some("tool_use") => {
-                            let input_obj = block
-                                .get("input")
-                                .and_then(Value::as_object)
-                                .cloned()
-                                .unwrap_or_default();
+                            let input = match block.get_mut("input").map(Value::take) {
+                                Some(Value::Object(obj)) => obj,
+                                _ => Map::new(),
+                            };
                             tool_calls.push(ToolCall {
-                                name: block
-                                    .get("name")
-                                    .and_then(Value::as_str)
-                                    .unwrap_or("")
-                                    .to_string(),
-                                input: input_obj.into_iter().collect(),
-                                tool_use_id: block
-                                    .get("id")
-                                    .and_then(Value::as_str)
-                                    .unwrap_or("")
-                                    .to_string(),
+                                name: self.tool_names.intern(
+                                    block.get("name").and_then(Value::as_str).unwrap_or(""),
+                                ),
+                                input,
+                                tool_use_id: take_string(&mut block, "id"),
                                 turn_index,
                             });
                         }
                         Some("text") => {
-                            if let Some(t) = block.get("text").and_then(Value::as_str) {
-                                text_blocks.push(t.to_string());
+                            if let Some(Value::String(t)) = block.get_mut("text").map(Value::take) {
+                                text_blocks.push(t);
                             }
                         }
                         _ => {}
@@ -138,70 +155,81 @@ pub fn parse_stream_json(raw_output: &str) -> RunResult {
                         .unwrap_or(0),
                     tool_calls,
                 };
-                turns.push(turn);
-                turn_index += 1;
+                self.turns.push(turn);
 
                 if !text_blocks.is_empty() {
-                    all_text_parts.push(text_blocks.join("\n"));
+                    self.all_text_parts.push(text_blocks.join("\n"));
                 }
             }
             Some("result") => {
-                final_summary = event;
+                self.final_summary = event;
             }
             _ => {}
         }
     }
 
-    let usage = final_summary.get("usage").cloned().unwrap_or(Value::Null);
+    /// Finish the stream and build the run's result.
+    pub fn finish(self) -> RunResult {
+        let StreamParser {
+            session_id,
+            turns,
+            all_text_parts,
+            final_summary,
+            tool_names: _,
+        } = self;
+        let usage = &final_summary["usage"];
 
-    RunResult {
-        session_id,
-        num_turns: final_summary
-            .get("num_turns")
-            .and_then(Value::as_u64)
-            .unwrap_or(turns.len() as u64),
-        duration_ms: final_summary
-            .get("duration_ms")
-            .and_then(Value::as_u64)
-            .unwrap_or(0),
-        duration_api_ms: final_summary
-            .get("duration_api_ms")
-            .and_then(Value::as_u64)
-            .unwrap_or(0),
-        total_input_tokens: usage
-            .get("input_tokens")
-            .and_then(Value::as_u64)
-            .unwrap_or(0),
-        total_output_tokens: usage
-            .get("output_tokens")
-            .and_then(Value::as_u64)
-            .unwrap_or(0),
-        total_cache_creation_tokens: usage
-            .get("cache_creation_input_tokens")
-            .and_then(Value::as_u64)
-            .unwrap_or(0),
-        total_cache_read_tokens: usage
-            .get("cache_read_input_tokens")
-            .and_then(Value::as_u64)
-            .unwrap_or(0),
-        result_text: all_text_parts.join("\n"),
-        turns,
-        task_name: String::new(),
-        mode_name: String::new(),
-        model_name: String::new(),
-        repetition: 0,
-        correct: false,
-        correctness_reason: String::new(),
+        RunResult {
+            session_id,
+            num_turns: final_summary
+                .get("num_turns")
+                .and_then(Value::as_u64)
+                .unwrap_or(turns.len() as u64),
+            duration_ms: final_summary
+                .get("duration_ms")
+                .and_then(Value::as_u64)
+                .unwrap_or(0),
+            duration_api_ms: final_summary
+                .get("duration_api_ms")
+                .and_then(Value::as_u64)
+                .unwrap_or(0),
+            total_input_tokens: usage
+                .get("input_tokens")
+                .and_then(Value::as_u64)
+                .unwrap_or(0),
+            total_output_tokens: usage
+                .get("output_tokens")
+                .and_then(Value::as_u64)
+                .unwrap_or(0),
+            total_cache_creation_tokens: usage
+                .get("cache_creation_input_tokens")
+                .and_then(Value::as_u64)
+                .unwrap_or(0),
+            total_cache_read_tokens: usage
+                .get("cache_read_input_tokens")
+                .and_then(Value::as_u64)
+                .unwrap_or(0),
+            result_text: all_text_parts.join("\n"),
+            turns,
+            task_name: String::new(),
+            mode_name: String::new(),
+            model_name: String::new(),
+            repetition: 0,
+            correct: false,
+            correctness_reason: String::new(),
+        }
     }
 }
 
-/// Count tool calls by name across all turns.
-pub fn tool_call_counts(result: &RunResult) -> HashMap<String, u64> {
-    let mut counts: HashMap<String, u64> = HashMap::new();
-    for turn in &result.turns {
-        for tc in &turn.tool_calls {
-            *counts.entry(tc.name.clone()).or_insert(0) += 1;
-        }
+/// Count tool calls by name across all turns, returning the per-tool counts
+/// and the overall total from the same pass. Names are borrowed from the
+/// result, so only one key per distinct tool is stored.
+pub fn tool_call_counts(result: &RunResult) -> (HashMap<&str, u64>, u64) {
+    let mut counts: HashMap<&str, u64> = HashMap::new();
+    let mut total = 0;
+    for tc in result.turns.iter().flat_map(|t| &t.tool_calls) {
+        *counts.entry(&*tc.name).or_insert(0) += 1;
+        total += 1;
     }
-    counts
+    (counts, total)
 }
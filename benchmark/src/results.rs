@@ -0,0 +1,376 @@
+use crate::json_helpers::{get_bool, get_str, get_u64};
+use crate::text::Interner;
+use serde::{Deserialize, Deserializer};
+use serde_json::Value;
+use std::borrow::Cow;
+use std::collections::BTreeMap;
+use std::fs::{self, File};
+use std::io::{BufRead, BufReader, Seek, SeekFrom};
+use std::num::NonZeroUsize;
+use std::path::Path;
+use std::sync::Arc;
+use std::thread;
+
+/// One line of a results file, pulled out of its JSON record once at load
+/// time so the report code reads plain fields instead of looking keys up in a
+/// map for every statistic. Missing fields take their zero value.
+///
+/// The label fields repeat on nearly every line, so they are interned: runs
+/// parsed from the same byte range share one allocation per distinct label.
+/// A streamed file is a single range; a large file parsed in parallel holds
+/// one copy of each label per range (see `load_results_parallel`).
+pub struct Run {
+    pub task: Arc<str>,
+    pub repo: Arc<str>,
+    pub mode: Arc<str>,
+    pub model: Arc<str>,
+    pub repetition: u64,
+    pub glean_version: Option<String>,
+    pub glean_commit: Option<String>,
+    pub num_turns: u64,
+    pub num_tool_calls: u64,
+    pub tool_calls: BTreeMap<String, u64>,
+    pub duration_ms: u64,
+    pub context_tokens: u64,
+    pub output_tokens: u64,
+    pub input_tokens: u64,
+    pub cache_creation_tokens: u64,
+    pub cache_read_tokens: u64,
+    pub per_turn_context_tokens: Vec<u64>,
+    pub correct: bool,
+    /// Set when the run failed before producing a result.
+    pub error: Option<String>,
+}
+
+/// The fields of a results record that `Run` keeps, decoded directly by a
+/// schema-specific deserializer. Everything else on the line (result text,
+/// tool sequence, ...) is skipped without being built, and labels borrow
+/// from the line buffer until they are interned.
+#[derive(Deserialize, Default)]
+#[serde(default)]
+struct RawRun<'a> {
+    #[serde(borrow)]
+    task: Cow<'a, str>,
+    #[serde(borrow)]
+    repo: Cow<'a, str>,
+    #[serde(borrow)]
+    mode: Cow<'a, str>,
+    #[serde(borrow)]
+    model: Cow<'a, str>,
+    repetition: u64,
+    glean_version: Option<String>,
+    glean_commit: Option<String>,
+    num_turns: u64,
+    num_tool_calls: u64,
+    tool_calls: BTreeMap<String, u64>,
+    duration_ms: u64,
+    context_tokens: u64,
+    output_tokens: u64,
+    input_tokens: u64,
+    cache_creation_tokens: u64,
+    cache_read_tokens: u64,
+    per_turn_context_tokens: Vec<u64>,
+    correct: bool,
+    #[serde(deserialize_with = "error_present")]
+    error: Option<String>,
+}
+
+/// Any `error` value marks a failed run, even `null`.
+fn error_present<'de, D: Deserializer<'de>>(d: D) -> Result<Option<String>, D::Error> {
+    let e = Value::deserialize(d)?;
+    Ok(Some(
+        e.as_str().map_or_else(|| e.to_string(), str::to_owned),
+    ))
+}
+
+impl Run {
+    /// Decode one results line. Records whose fields have unexpected types
+    /// fall back to a lenient read that zeroes whatever does not fit.
+    fn parse(line: &[u8], labels: &mut Interner) -> Option<Self> {
+        match serde_json::from_slice::<RawRun>(line) {
+            Ok(raw) => Some(Run::from_raw(raw, labels)),
+            Err(_) => serde_json::from_slice(line)
+                .ok()
+                .map(|v| Run::from_value(&v, labels)),
+        }
+    }
+
+    fn from_raw(raw: RawRun, labels: &mut Interner) -> Self {
+        Run {
+            task: labels.intern(&raw.task),
+            repo: labels.intern(&raw.repo),
+            mode: labels.intern(&raw.mode),
+            model: labels.intern(&raw.model),
+            repetition: raw.repetition,
+            glean_version: raw.glean_version,
+            glean_commit: raw.glean_commit,
+            num_turns: raw.num_turns,
+            num_tool_calls: raw.num_tool_calls,
+            tool_calls: raw.tool_calls,
+            duration_ms: raw.duration_ms,
+            context_tokens: raw.context_tokens,
+            output_tokens: raw.output_tokens,
+            input_tokens: raw.input_tokens,
+            cache_creation_tokens: raw.cache_creation_tokens,
+            cache_read_tokens: raw.cache_read_tokens,
+            per_turn_context_tokens: raw.per_turn_context_tokens,
+            correct: raw.correct,
+            error: raw.error,
+        }
+    }
+
+    fn from_value(v: &Value, labels: &mut Interner) -> Self {
+        let opt_str = |key| v.get(key).and_then(Value::as_str).map(str::to_owned);
+        Run {
+            task: labels.intern(get_str(v, "task")),
+            repo: labels.intern(get_str(v, "repo")),
+            mode: labels.intern(get_str(v, "mode")),
+            model: labels.intern(get_str(v, "model")),
+            repetition: get_u64(v, "repetition"),
+            glean_version: opt_str("glean_version"),
+            glean_commit: opt_str("glean_commit"),
+            num_turns: get_u64(v, "num_turns"),
+            num_tool_calls: get_u64(v, "num_tool_calls"),
+            tool_calls: v
+                .get("tool_calls")
+                .and_then(Value::as_object)
+                .map(|tc| {
+                    tc.iter()
+                        .filter_map(|(name, n)| Some((name.clone(), n.as_u64()?)))
+                        .collect()
+                })
+                .unwrap_or_default(),
+            duration_ms: get_u64(v, "duration_ms"),
+            context_tokens: get_u64(v, "context_tokens"),
+            output_tokens: get_u64(v, "output_tokens"),
+            input_tokens: get_u64(v, "input_tokens"),
+            cache_creation_tokens: get_u64(v, "cache_creation_tokens"),
+            cache_read_tokens: get_u64(v, "cache_read_tokens"),
+            per_turn_context_tokens: v
+                .get("per_turn_context_tokens")
+                .and_then(Value::as_array)
+                .map(|a| a.iter().filter_map(Value::as_u64).collect())
+                .unwrap_or_default(),
+            correct: get_bool(v, "correct"),
+            error: v
+                .get("error")
+                .map(|e| e.as_str().map_or_else(|| e.to_string(), str::to_owned)),
+        }
+    }
+}
+
+/// Results files larger than this are parsed across all cores; smaller ones
+/// stream, since thread startup would outweigh the parse time.
+const PARALLEL_PARSE_BYTES: u64 = 32 * 1024 * 1024;
+
+/// Load a JSONL results file. Blank and malformed lines are rejected by the
+/// parser and skipped.
+pub fn load_results(path: &Path) -> Vec<Run> {
+    load(path, false)
+}
+
+/// Like [`load_results`], but drop failed runs before parsing them: a line
+/// carrying an `"error"` key is recognized from its raw bytes and skipped.
+pub fn load_valid_results(path: &Path) -> Vec<Run> {
+    load(path, true)
+}
+
+fn load(path: &Path, skip_errors: bool) -> Vec<Run> {
+    let size = fs::metadata(path).map_or(0, |m| m.len());
+    if size > PARALLEL_PARSE_BYTES {
+        return load_results_parallel(path, size, skip_errors);
+    }
+    load_range(path, 0, u64::MAX, skip_errors)
+}
+
+/// Whether a raw results line has an `"error"` key at any depth. Inside JSON
+/// string values quotes are escaped, so the unescaped quoted word followed by
+/// a colon can only be a key, though possibly one in a nested object. Records
+/// written by `run.rs` never nest one: `tool_calls` is keyed by tool name, and
+/// `tool_sequence` args keep only the keys `compact_arg` allows.
+fn has_error_key(line: &[u8]) -> bool {
+    const KEY: &[u8] = b"\"error\"";
+    line.windows(KEY.len()).enumerate().any(|(i, w)| {
+        w == KEY
+            && line[i + KEY.len()..]
+                .iter()
+                .find(|b| !b.is_ascii_whitespace())
+                == Some(&b':')
+    })
+}
+
+/// Split the file into one byte range per core and parse the ranges on
+/// scoped threads, concatenating in file order. Each worker streams its own
+/// range, so the file is never held in memory whole.
+fn load_results_parallel(path: &Path, size: u64, skip_errors: bool) -> Vec<Run> {
+    let workers = thread::available_parallelism().map_or(1, NonZeroUsize::get) as u64;
+    let bounds: Vec<u64> = (0..=workers).map(|i| size * i / workers).collect();
+
+    thread::scope(|s| {
+        let handles: Vec<_> = bounds
+            .windows(2)
+            .map(|w| {
+                let (start, end) = (w[0], w[1]);
+                s.spawn(move || load_range(path, start, end, skip_errors))
+            })
+            .collect();
+        handles
+            .into_iter()
+            .flat_map(|h| h.join().expect("results parser thread panicked"))
+            .collect()
+    })
+}
+
+/// Parse every line that starts at a byte offset in `start..end`, straight
+/// from a reused byte buffer. A line straddling `start` belongs to the
+/// previous range, so it is skipped here.
+fn load_range(path: &Path, start: u64, end: u64, skip_errors: bool) -> Vec<Run> {
+    let file = File::open(path).expect("Failed to read results file");
+    let mut reader = BufReader::new(file);
+    let mut line = Vec::new();
+    let mut pos = start;
+    if start > 0 {
+        reader
+            .seek(SeekFrom::Start(start - 1))
+            .expect("Failed to read results file");
+        pos = start - 1
+            + reader
+                .read_until(b'\n', &mut line)
+                .expect("Failed to read results file") as u64;
+        line.clear();
+    }
+
+    let mut labels = Interner::default();
+    let mut results = Vec::new();
+    while pos < end {
+        let n = reader
+            .read_until(b'\n', &mut line)
+            .expect("Failed to read results file");
+        if n == 0 {
+            break;
+        }
+        pos += n as u64;
+        if skip_errors && has_error_key(&line) {
+            line.clear();
+            continue;
+        }
+        if let Some(run) = Run::parse(&line, &mut labels) {
+            results.push(run);
+        }
+        line.clear();
+    }
+    results
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    /// Mixed results lines: valid runs, a failed run, a blank line, a
+    /// malformed line, and a run whose answer text mentions "error".
+    const SAMPLE: &str = concat!(
+        r#"{"task":"a","mode":"glean","model":"sonnet","repetition":0,"num_turns":3,"correct":true}"#,
+        "\n",
+        r#"{"task":"a","mode":"glean","model":"sonnet","repetition":1,"error":"timeout","correct":false}"#,
+        "\n",
+        "\n",
+        "{not json at all\n",
+        r#"{"task":"b","mode":"baseline","model":"sonnet","repetition":0,"num_turns":7,"result_text":"no \"error\" here"}"#,
+        "\n",
+        r#"{"task":"c","mode":"glean","model":"opus","repetition":2,"num_turns":1,"tool_calls":{"Read":2}}"#,
+        "\n",
+        r#"{"task":"d","mode":"glean","model":"haiku","repetition":0,"num_turns":4}"#,
+    );
+
+    /// Write `SAMPLE` to a file unique to this test.
+    fn sample_file(name: &str) -> std::path::PathBuf {
+        let path =
+            std::env::temp_dir().join(format!("glean-bench-{name}-{}.jsonl", std::process::id()));
+        fs::write(&path, SAMPLE).unwrap();
+        path
+    }
+
+    /// The fields that identify a loaded run.
+    fn keys(runs: &[Run]) -> Vec<(String, u64, u64, Option<String>)> {
+        runs.iter()
+            .map(|r| {
+                (
+                    r.task.to_string(),
+                    r.repetition,
+                    r.num_turns,
+                    r.error.clone(),
+                )
+            })
+            .collect()
+    }
+
+    #[test]
+    fn load_range_splits_match_whole_file() {
+        let path = sample_file("splits");
+        let len = SAMPLE.len() as u64;
+
+        for skip_errors in [false, true] {
+            let whole = keys(&load_range(&path, 0, u64::MAX, skip_errors));
+            assert_eq!(whole.len(), if skip_errors { 4 } else { 5 });
+
+            // Every two-way split, including those landing on and just
+            // after each '\n'.
+            for mid in 0..=len {
+                let mut split = keys(&load_range(&path, 0, mid, skip_errors));
+                split.extend(keys(&load_range(&path, mid, u64::MAX, skip_errors)));
+                assert_eq!(split, whole, "split at {mid}, skip_errors={skip_errors}");
+            }
+
+            // Three-way splits over a grid of start/end pairs.
+            for a in (0..=len).step_by(5) {
+                for b in (a..=len).step_by(3) {
+                    let mut split = keys(&load_range(&path, 0, a, skip_errors));
+                    split.extend(keys(&load_range(&path, a, b, skip_errors)));
+                    split.extend(keys(&load_range(&path, b, len, skip_errors)));
+                    assert_eq!(split, whole, "splits at {a},{b}, skip_errors={skip_errors}");
+                }
+            }
+        }
+
+        // A range starting exactly on a '\n' owns the line after it.
+        let newline = SAMPLE.find('\n').unwrap() as u64;
+        let tail = keys(&load_range(&path, newline, u64::MAX, false));
+        assert_eq!(tail.first().map(|k| k.0.as_str()), Some("a"));
+        assert_eq!(tail.first().map(|k| k.1), Some(1));
+
+        fs::remove_file(&path).ok();
+    }
+
+    #[test]
+    fn has_error_key_matches_error_keys_only() {
+        assert!(has_error_key(br#"{"task":"a","error":"timeout"}"#));
+        assert!(has_error_key(br#"{"task":"a","error" : "timeout"}"#));
+        assert!(has_error_key(b"{\"task\":\"a\",\"error\"\t:\n1}"));
+        assert!(has_error_key(br#"{"task":"a","error": null}"#));
+
+        assert!(!has_error_key(
+            br#"{"task":"a","result_text":"\"error\": boom"}"#
+        ));
+        assert!(!has_error_key(br#"{"task":"a","error_rate":0.5}"#));
+        assert!(!has_error_key(br#"{"task":"a","result_text":"error"}"#));
+        assert!(!has_error_key(br#"{"task":"a","mode":"error"}"#));
+
+        // Nested keys match too; `run.rs` never writes one.
+        assert!(has_error_key(
+            br#"{"task":"a","tool_sequence":[{"name":"x","args":{"error":"y"}}]}"#
+        ));
+    }
+
+    #[test]
+    fn parallel_load_matches_streaming_load() {
+        let path = sample_file("parallel");
+        let size = SAMPLE.len() as u64;
+        for skip_errors in [false, true] {
+            assert_eq!(
+                keys(&load_results_parallel(&path, size, skip_errors)),
+                keys(&load_range(&path, 0, u64::MAX, skip_errors)),
+            );
+        }
+        fs::remove_file(&path).ok();
+    }
+}
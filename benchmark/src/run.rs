@@ -3,14 +3,19 @@ use crate::parse::{self, RunResult};
 use crate::task::Task;
 use serde_json::{Value, json};
 use std::collections::HashMap;
-use std::fs::{self, File};
-use std::io::{BufWriter, Write};
+use std::fmt::Write as _;
+use std::fs::{self, File, OpenOptions};
+use std::io::{self, BufRead, BufReader, BufWriter, Read, Write};
 use std::path::{Path, PathBuf};
-use std::process::Command;
+use std::process::{Command, Stdio};
+use std::sync::atomic::{AtomicUsize, Ordering};
+use std::sync::{LazyLock, Mutex};
+use std::thread;
 use std::time::Instant;
 
-/// Get installed glean version via `glean --version`.
-fn glean_version() -> Option<String> {
+/// Installed glean version from `glean --version`. The binary does not change
+/// during a benchmark session, so it is asked once rather than once per run.
+static GLEAN_VERSION: LazyLock<Option<String>> = LazyLock::new(|| {
     Command::new("glean")
         .arg("--version")
         .output()
@@ -23,16 +28,21 @@ fn glean_version() -> Option<String> {
                 None
             }
         })
+});
+
+/// Get installed glean version via `glean --version`.
+fn glean_version() -> Option<&'static str> {
+    GLEAN_VERSION.as_deref()
 }
 
 /// Get the glean build commit from `glean --version` output.
 /// Parses "glean 0.1.0 (abc1234)" → "abc1234" or "abc1234-dirty".
-fn glean_build_commit() -> Option<String> {
+fn glean_build_commit() -> Option<&'static str> {
     let version = glean_version()?;
     // Version string is "0.1.0 (abc1234)" or "0.1.0 (abc1234-dirty)"
     let start = version.find('(')?;
     let end = version.find(')')?;
-    Some(version[start + 1..end].to_string())
+    Some(&version[start + 1..end])
 }
 
 /// Resolve working directory for a task's repo.
@@ -42,7 +52,17 @@ fn get_repo_path(repo_name: &str) -> PathBuf {
 }
 
 /// Reset a repo to its clean state (undo edits, remove untracked files).
+/// A tree that is already clean, the usual case for read-only tasks, costs a
+/// single `git status` instead of two mutating git processes.
 fn reset_repo(repo_path: &Path) {
+    let dirty = Command::new("git")
+        .args(["status", "--porcelain", "-z"])
+        .current_dir(repo_path)
+        .output()
+        .map_or(true, |o| !o.status.success() || !o.stdout.is_empty());
+    if !dirty {
+        return;
+    }
     let _ = Command::new("git")
         .args(["checkout", "--", "."])
         .current_dir(repo_path)
@@ -53,32 +73,44 @@ fn reset_repo(repo_path: &Path) {
         .output();
 }
 
+/// Cut `s` to at most `max` bytes without splitting a character.
+fn truncate_str(s: &str, max: usize) -> &str {
+    if s.len() <= max {
+        return s;
+    }
+    let mut end = max;
+    while !s.is_char_boundary(end) {
+        end -= 1;
+    }
+    &s[..end]
+}
+
+/// Abbreviate a tool argument for the compact sequence, or `None` if the
+/// argument is not recorded there.
+fn compact_arg<'a>(key: &str, value: &'a str) -> Option<&'a str> {
+    match key {
+        "command" => Some(truncate_str(value, 80)),
+        "file_path" => Some(value.rsplit('/').next().unwrap_or(value)),
+        "pattern" | "query" | "path" | "scope" | "kind" | "section" | "expand" => {
+            Some(truncate_str(value, 60))
+        }
+        _ => None,
+    }
+}
+
 /// Extract ordered tool call names + key args from all turns.
 fn compact_tool_sequence(result: &RunResult) -> Vec<Value> {
     let mut seq = Vec::new();
     for turn in &result.turns {
         for tc in &turn.tool_calls {
-            let mut entry = serde_json::Map::new();
-            entry.insert("name".into(), json!(tc.name));
             let mut args = serde_json::Map::new();
             for (k, v) in &tc.input {
-                match k.as_str() {
-                    "command" => {
-                        let s = v.as_str().unwrap_or("");
-                        args.insert(k.clone(), json!(&s[..s.len().min(80)]));
-                    }
-                    "file_path" => {
-                        let s = v.as_str().unwrap_or("");
-                        let fname = s.rsplit('/').next().unwrap_or(s);
-                        args.insert(k.clone(), json!(fname));
-                    }
-                    "pattern" | "query" | "path" | "scope" | "kind" | "section" | "expand" => {
-                        let s = v.as_str().unwrap_or("");
-                        args.insert(k.clone(), json!(&s[..s.len().min(60)]));
-                    }
-                    _ => {}
+                if let Some(short) = compact_arg(k, v.as_str().unwrap_or("")) {
+                    args.insert(k.clone(), Value::from(short));
                 }
             }
+            let mut entry = serde_json::Map::new();
+            entry.insert("name".into(), Value::from(&*tc.name));
             if !args.is_empty() {
                 entry.insert("args".into(), Value::Object(args));
             }
@@ -139,34 +171,59 @@ fn run_single(
         eprintln!("    Running: {}", cmd_args.join(" "));
     }
 
-    // Clear env and re-add without CLAUDECODE (nested session check)
-    // and ANTHROPIC_API_KEY (force Max subscription auth instead of API key)
-    let env: HashMap<String, String> = std::env::vars()
-        .filter(|(k, _)| k != "CLAUDECODE" && k != "ANTHROPIC_API_KEY")
-        .collect();
-
     let start = Instant::now();
-    let output = Command::new(&cmd_args[0])
+    let mut child = Command::new(&cmd_args[0])
         .args(&cmd_args[1..])
         .current_dir(&repo_path)
-        .env_clear()
-        .envs(&env)
-        .output()
+        // Inherit the env minus CLAUDECODE (nested session check) and
+        // ANTHROPIC_API_KEY (force Max subscription auth instead of API key)
+        .env_remove("CLAUDECODE")
+        .env_remove("ANTHROPIC_API_KEY")
+        .stdin(Stdio::null())
+        .stdout(Stdio::piped())
+        .stderr(Stdio::piped())
+        .spawn()
         .map_err(|e| format!("Failed to spawn claude: {e}"))?;
+
+    // Drain stderr on its own thread so claude can never stall on a full
+    // stderr pipe while we are reading stdout.
+    let mut stderr_pipe = child.stderr.take().expect("stderr is piped");
+    let stderr_reader = thread::spawn(move || {
+        let mut buf = Vec::new();
+        stderr_pipe.read_to_end(&mut buf).ok();
+        buf
+    });
+
+    // Parse stdout line by line as claude writes it, so the full stream is
+    // never buffered. Only the first 500 bytes are kept, for error reports.
+    let mut parser = parse::StreamParser::default();
+    let mut stdout_head = Vec::new();
+    {
+        let mut stdout = BufReader::new(child.stdout.take().expect("stdout is piped"));
+        let mut line = Vec::new();
+        while matches!(stdout.read_until(b'\n', &mut line), Ok(n) if n > 0) {
+            let room = 500usize.saturating_sub(stdout_head.len());
+            stdout_head.extend_from_slice(&line[..line.len().min(room)]);
+            parser.push_line(&line);
+            line.clear();
+        }
+    }
+    let status = child
+        .wait()
+        .map_err(|e| format!("Failed to wait for claude: {e}"))?;
+    let stderr = stderr_reader.join().unwrap_or_default();
     let elapsed_ms = start.elapsed().as_millis() as u64;
 
-    if !output.status.success() {
-        let stderr = String::from_utf8_lossy(&output.stderr);
-        let stdout = String::from_utf8_lossy(&output.stdout);
+    if !status.success() {
+        let stderr = String::from_utf8_lossy(&stderr);
+        let stdout = String::from_utf8_lossy(&stdout_head);
         return Err(format!(
-            "claude -p failed with code {:?}\nstderr: {stderr}\nstdout: {}",
-            output.status.code(),
-            &stdout[..stdout.len().min(500)]
+            "claude -p failed with code {:?}\nstderr: {stderr}\nstdout: {stdout}",
+            status.code(),
         ));
     }
 
-    let stdout = String::from_utf8_lossy(&output.stdout);
-    let mut run_result = parse::parse_stream_json(&stdout);
+    let mut run_result = parser.finish();
     run_result.task_name = task_name.to_string();
     run_result.mode_name = mode_name.to_string();
     run_result.model_name = model_name.to_string();
@@ -180,24 +237,15 @@ fn run_single(
     run_result.correct = correct;
     run_result.correctness_reason = reason.clone();
 
-    let tool_breakdown = parse::tool_call_counts(&run_result);
+    let (tool_breakdown, num_tool_calls) = parse::tool_call_counts(&run_result);
     let per_turn_context: Vec<u64> = run_result
         .turns
         .iter()
         .map(|t| t.context_tokens())
         .collect();
     let total_context: u64 = per_turn_context.iter().sum();
-    let num_tool_calls: u64 = tool_breakdown.values().sum();
 
-    let result_text_truncated = if run_result.result_text.len() > 5000 {
-        let mut end = 5000;
-        while !run_result.result_text.is_char_boundary(end) {
-            end -= 1;
-        }
-        &run_result.result_text[..end]
-    } else {
-        &run_result.result_text
-    };
+    let result_text_truncated = truncate_str(&run_result.result_text, 5000);
 
     Ok(json!({
         "task": task_name,
@@ -224,6 +272,24 @@ fn run_single(
     }))
 }
 
+/// Create (or truncate) a results file and reopen it for appending.
+fn create_results_file(path: &Path) -> File {
+    File::create(path).expect("Failed to create output file");
+    OpenOptions::new()
+        .append(true)
+        .open(path)
+        .expect("Failed to open output file")
+}
+
+/// Append one JSONL record with a single `write`. The file is in append
+/// mode, so concurrent workers never interleave partial lines, and nothing
+/// sits in a user-space buffer waiting for a flush.
+fn append_record(mut file: &File, record: &Value) -> io::Result<()> {
+    let mut line = serde_json::to_vec(record)?;
+    line.push(b'\n');
+    file.write_all(&line)
+}
+
 /// A specific run to retry (extracted from a previous JSONL).
 struct RetrySpec {
     task: String,
@@ -327,14 +393,15 @@ pub fn retry(
     println!("{}", "=".repeat(70));
     println!();
 
-    let file = File::create(&output_file).expect("Failed to create output file");
-    let mut writer = BufWriter::new(file);
+    let file = create_results_file(&output_file);
 
     // Copy good results
+    let mut writer = BufWriter::new(&file);
     for line in &good_lines {
         writeln!(writer, "{line}").unwrap();
     }
     writer.flush().unwrap();
+    drop(writer);
 
     let total = retries.len();
     for (i, spec) in retries.iter().enumerate() {
@@ -356,8 +423,7 @@ pub fn retry(
             config::DEFAULT_MAX_BUDGET_USD,
         ) {
             Ok(result) => {
-                writeln!(writer, "{}", serde_json::to_string(&result).unwrap()).unwrap();
-                writer.flush().unwrap();
+                append_record(&file, &result).unwrap();
 
                 let correct = result["correct"].as_bool().unwrap_or(false);
                 let status = if correct { "\u{2713}" } else { "\u{2717}" };
@@ -388,8 +454,7 @@ pub fn retry(
                     "correct": false,
                     "correctness_reason": format!("Exception: {e}"),
                 });
-                writeln!(writer, "{}", serde_json::to_string(&error_result).unwrap()).unwrap();
-                writer.flush().unwrap();
+                append_record(&file, &error_result).unwrap();
             }
         }
     }
@@ -432,7 +497,19 @@ pub fn parse_comma_list<'a>(
     Ok(result)
 }
 
+/// One (task, mode, model, repetition) combination to run.
+struct Combo<'a> {
+    task_name: &'a str,
+    mode_name: &'a str,
+    model_name: &'a str,
+    rep: u32,
+}
+
 /// Main benchmark runner.
+///
+/// `workers` (at least 1) is how many repos are benchmarked at once; runs
+/// against the same working directory always execute one after another, in
+/// order.
 #[expect(clippy::too_many_arguments)]
 pub fn run(
     model_names: &[&str],
@@ -444,6 +521,7 @@ pub fn run(
     tasks: &HashMap<&str, Box<dyn Task>>,
     output_path: Option<&Path>,
     budget: Option<f64>,
+    workers: usize,
 ) {
     let budget = budget.unwrap_or(config::DEFAULT_MAX_BUDGET_USD);
     let all_models = config::models();
@@ -562,106 +640,156 @@ pub fn run(
     };
     println!("Repos:       {}", repos_used.join(", "));
     println!("Repetitions: {reps}");
+    println!("Workers:     {workers}");
     println!("Output:      {}", output_file.display());
     println!("{}", "=".repeat(70));
     println!();
 
     let total_runs = filtered_tasks.len() * mode_names.len() * model_names.len() * reps as usize;
-    let mut current_run = 0;
-
-    let file = File::create(&output_file).expect("Failed to create output file");
-    let mut writer = BufWriter::new(file);
+    let current_run = AtomicUsize::new(0);
 
-    let mut prev_task: Option<&str> = None;
-    let mut prev_mode: Option<&str> = None;
+    let file = create_results_file(&output_file);
 
+    // Runs that share a working directory must stay serial: edit tasks reset
+    // and modify the checkout. With more than one worker, each repo becomes
+    // its own queue of runs and the queues are worked off concurrently.
+    let parallel = workers > 1;
+    let mut groups: Vec<(PathBuf, Vec<Combo>)> = Vec::new();
     for &task_name in &filtered_tasks {
         let task = &*tasks[task_name];
+        let repo_path = if parallel {
+            task.work_dir()
+                .unwrap_or_else(|| get_repo_path(task.repo()))
+        } else {
+            PathBuf::new()
+        };
+        let group = match groups.iter().position(|(p, _)| *p == repo_path) {
+            Some(i) => &mut groups[i].1,
+            None => {
+                groups.push((repo_path, Vec::new()));
+                &mut groups.last_mut().unwrap().1
+            }
+        };
         for &mode_name in mode_names {
-            let mode = &all_modes[mode_name];
             for &model_name in model_names {
-                let model_id = all_models[model_name];
                 for rep in 0..reps {
-                    current_run += 1;
-                    let run_id = format!("{task_name}/{mode_name}/{model_name}/rep{rep}");
-
-                    // Reset repo if needed (for edit tasks, reset before each run;
-                    // for others, reset when mode changes)
-                    let repo_path = task
-                        .work_dir()
-                        .unwrap_or_else(|| get_repo_path(task.repo()));
-                    let mut needs_reset = false;
-                    if !task.ground_truth().file_path.is_empty() {
-                        if rep > 0
-                            || prev_mode != Some(mode_name)
-                            || prev_task != Some(task_name)
-                        {
-                            needs_reset = true;
-                        }
-                    } else if prev_mode != Some(mode_name) {
-                        needs_reset = true;
-                    }
-                    if needs_reset {
-                        if verbose {
-                            eprintln!("  Resetting repo {}...", task.repo());
-                        }
-                        reset_repo(&repo_path);
+                    group.push(Combo {
+                        task_name,
+                        mode_name,
+                        model_name,
+                        rep,
+                    });
+                }
+            }
+        }
+    }
+
+    let run_group = |combos: Vec<Combo>| {
+        let mut prev_task: Option<&str> = None;
+        let mut prev_mode: Option<&str> = None;
+
+        for Combo {
+            task_name,
+            mode_name,
+            model_name,
+            rep,
+        } in combos
+        {
+            let task = &*tasks[task_name];
+            let mode = &all_modes[mode_name];
+            let model_id = all_models[model_name];
+            let n = current_run.fetch_add(1, Ordering::Relaxed) + 1;
+            let run_id = format!("{task_name}/{mode_name}/{model_name}/rep{rep}");
+
+            // Reset repo if needed (for edit tasks, reset before each run;
+            // for others, reset when mode changes)
+            let repo_path = task
+                .work_dir()
+                .unwrap_or_else(|| get_repo_path(task.repo()));
+            let mut needs_reset = false;
+            if !task.ground_truth().file_path.is_empty() {
+                if rep > 0 || prev_mode != Some(mode_name) || prev_task != Some(task_name) {
+                    needs_reset = true;
+                }
+            } else if prev_mode != Some(mode_name) {
+                needs_reset = true;
+            }
+            if needs_reset {
+                if verbose {
+                    eprintln!("  Resetting repo {}...", task.repo());
+                }
+                reset_repo(&repo_path);
+            }
+            prev_task = Some(task_name);
+            prev_mode = Some(mode_name);
+
+            // Serial runs announce themselves up front; parallel ones print
+            // their header with the outcome so the two stay together.
+            let header = format!("[{n}/{total_runs}] {run_id}");
+            if !parallel {
+                println!("{header}");
+            }
+            let mut report = String::new();
+
+            let record = match run_single(
+                task, task_name, mode, mode_name, model_id, model_name, rep, verbose, budget,
+            ) {
+                Ok(result) => {
+                    let correct = result["correct"].as_bool().unwrap_or(false);
+                    let status = if correct { "\u{2713}" } else { "\u{2717}" };
+                    let num_turns = result["num_turns"].as_u64().unwrap_or(0);
+                    let ctx = result["context_tokens"].as_u64().unwrap_or(0);
+                    let out = result["output_tokens"].as_u64().unwrap_or(0);
+                    let dur = result["duration_ms"].as_u64().unwrap_or(0);
+
+                    let _ = writeln!(report, "  {status} {num_turns}t {ctx}ctx {out}out {dur}ms");
+
+                    if !correct {
+                        let reason = result["correctness_reason"].as_str().unwrap_or("unknown");
+                        let _ = writeln!(report, "  \u{2192} {reason}");
                     }
-                    prev_task = Some(task_name);
-                    prev_mode = Some(mode_name);
-
-                    println!("[{current_run}/{total_runs}] {run_id}");
-
-                    match run_single(
-                        task, task_name, mode, mode_name, model_id, model_name, rep, verbose,
-                        budget,
-                    ) {
-                        Ok(result) => {
-                            writeln!(writer, "{}", serde_json::to_string(&result).unwrap())
-                                .unwrap();
-                            writer.flush().unwrap();
-
-                            let correct = result["correct"].as_bool().unwrap_or(false);
-                            let status = if correct { "\u{2713}" } else { "\u{2717}" };
-                            let num_turns = result["num_turns"].as_u64().unwrap_or(0);
-                            let ctx = result["context_tokens"].as_u64().unwrap_or(0);
-                            let out = result["output_tokens"].as_u64().unwrap_or(0);
-                            let dur = result["duration_ms"].as_u64().unwrap_or(0);
-
-                            println!(
-                                "  {status} {num_turns}t {ctx}ctx {out}out {dur}ms"
-                            );
-
-                            if !correct {
-                                let reason =
-                                    result["correctness_reason"].as_str().unwrap_or("unknown");
-                                println!("  \u{2192} {reason}");
-                            }
-                        }
-                        Err(e) => {
-                            if e.contains("timeout") || e.contains("Timeout") {
-                                println!("  \u{2717} TIMEOUT (>300s)");
-                            } else {
-                                println!("  \u{2717} ERROR: {e}");
-                            }
-                            let error_result = json!({
-                                "task": task_name,
-                                "mode": mode_name,
-                                "model": model_name,
-                                "repetition": rep,
-                                "error": e,
-                                "correct": false,
-                                "correctness_reason": format!("Exception: {e}"),
-                            });
-                            writeln!(writer, "{}", serde_json::to_string(&error_result).unwrap())
-                                .unwrap();
-                            writer.flush().unwrap();
-                        }
+                    result
+                }
+                Err(e) => {
+                    if e.contains("timeout") || e.contains("Timeout") {
+                        let _ = writeln!(report, "  \u{2717} TIMEOUT (>300s)");
+                    } else {
+                        let _ = writeln!(report, "  \u{2717} ERROR: {e}");
                     }
+                    json!({
+                        "task": task_name,
+                        "mode": mode_name,
+                        "model": model_name,
+                        "repetition": rep,
+                        "error": e,
+                        "correct": false,
+                        "correctness_reason": format!("Exception: {e}"),
+                    })
                 }
+            };
+            append_record(&file, &record).unwrap();
+
+            let mut stdout = io::stdout().lock();
+            if parallel {
+                writeln!(stdout, "{header}").unwrap();
             }
+            write!(stdout, "{report}").unwrap();
         }
-    }
+    };
+
+    let queue = Mutex::new(groups.into_iter().map(|(_, combos)| combos));
+    thread::scope(|s| {
+        for _ in 0..workers {
+            s.spawn(|| {
+                loop {
+                    let Some(combos) = queue.lock().unwrap().next() else {
+                        break;
+                    };
+                    run_group(combos);
+                }
+            });
+        }
+    });
 
     println!();
     println!("{}", "=".repeat(70));
@@ -673,3 +801,18 @@ pub fn run(
     println!("  bench analyze {}", output_file.display());
     println!();
 }
+
+#[cfg(test)]
+mod tests {
+    use super::compact_arg;
+
+    /// Tool args only reach the results file through this whitelist, which
+    /// is what keeps `results::has_error_key` from seeing a nested key.
+    #[test]
+    fn compact_arg_drops_unlisted_keys() {
+        assert_eq!(compact_arg("file_path", "/a/b/c.rs"), Some("c.rs"));
+        assert_eq!(compact_arg("pattern", "fn main"), Some("fn main"));
+        assert_eq!(compact_arg("error", "boom"), None);
+        assert_eq!(compact_arg("content", "error"), None);
+    }
+}
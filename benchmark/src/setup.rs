@@ -2,6 +2,7 @@ use crate::config;
 use std::fs;
 use std::path::Path;
 use std::process::Command;
+use std::thread;
 
 /// Resolve the glean binary: PATH first (as bare "glean"), then project build artifacts.
 fn find_glean_binary() -> Result<String, String> {
@@ -53,9 +54,49 @@ pub fn generate_mcp_config() -> Result<(), String> {
     Ok(())
 }
 
+/// Move an existing checkout to `commit_sha` without re-cloning: fetch the
+/// commit if it is missing, hard-reset to it, and drop untracked files.
+/// Returns false if the checkout points at a different remote or any step
+/// fails, in which case the caller re-clones.
+fn update_in_place(url: &str, commit_sha: &str, repo_path: &Path) -> bool {
+    Command::new("sh")
+        .args([
+            "-c",
+            r#"[ "$(git -C "$1" remote get-url origin)" = "$3" ] &&
+               { git -C "$1" cat-file -e "$2^{commit}" 2>/dev/null || git -C "$1" fetch -q origin "$2"; } &&
+               git -C "$1" reset -q --hard "$2" &&
+               git -C "$1" clean -ffdxq"#,
+            "sh",
+            &repo_path.display().to_string(),
+            commit_sha,
+            url,
+        ])
+        .output()
+        .is_ok_and(|o| o.status.success())
+}
+
+/// Whether the checkout is a partial clone (objects fetched lazily from origin).
+fn is_partial_clone(repo_path: &Path) -> bool {
+    Command::new("git")
+        .args(["config", "--get", "remote.origin.promisor"])
+        .current_dir(repo_path)
+        .output()
+        .is_ok_and(|o| String::from_utf8_lossy(&o.stdout).trim() == "true")
+}
+
 /// Clone and pin a single repository.
-fn setup_repo(name: &str, url: &str, commit_sha: &str, repo_path: &Path) {
-    if repo_path.exists() {
+///
+/// With `partial`, the clone is blobless: only the pinned commit's blobs are
+/// fetched, and any history-reading git command run later fetches the rest
+/// from the network on demand.
+fn setup_repo(name: &str, url: &str, commit_sha: &str, repo_path: &Path, partial: bool) {
+    if repo_path.exists() && is_partial_clone(repo_path) != partial {
+        // Updating in place would keep the wrong clone kind, so re-clone.
+        println!(
+            "  {name}: existing clone is {}, re-cloning...",
+            if partial { "full" } else { "partial" }
+        );
+    } else if repo_path.exists() {
         // Verify correct commit
         let output = Command::new("git")
             .args(["rev-parse", "HEAD"])
@@ -68,24 +109,48 @@ fn setup_repo(name: &str, url: &str, commit_sha: &str, repo_path: &Path) {
                 return;
             }
             println!(
-                "  {name}: at {}, need {}, re-cloning...",
+                "  {name}: at {}, need {}, updating...",
                 &current[..current.len().min(8)],
                 &commit_sha[..8]
             );
+            if update_in_place(url, commit_sha, repo_path) {
+                println!("  {name}: checked out {}", &commit_sha[..8]);
+                return;
+            }
+            println!("  {name}: update failed, re-cloning...");
         }
+    }
+
+    // A stale checkout is moved aside rather than deleted, and the new clone
+    // borrows its objects, so only what changed since comes over the network.
+    // --dissociate copies the borrowed objects in, so the stale copy can go.
+    let mut stale_name = repo_path.file_name().unwrap_or_default().to_os_string();
+    stale_name.push(".stale");
+    let stale_path = repo_path.with_file_name(stale_name);
+    if stale_path.exists() {
+        fs::remove_dir_all(&stale_path).ok();
+    }
+    if repo_path.exists() && fs::rename(repo_path, &stale_path).is_err() {
         fs::remove_dir_all(repo_path).ok();
     }
 
     println!("  {name}: cloning from {url}...");
-    let status = Command::new("git")
-        .args([
-            "clone",
-            "--no-checkout",
-            url,
-            &repo_path.display().to_string(),
-        ])
+    let mut clone = Command::new("git");
+    clone.arg("clone");
+    if partial {
+        clone.arg("--filter=blob:none");
+    }
+    let status = clone
+        .args(["--no-checkout", "--reference-if-able"])
+        .arg(&stale_path)
+        .arg("--dissociate")
+        .arg(url)
+        .arg(repo_path)
         .output()
         .expect("Failed to run git clone");
+    if stale_path.exists() {
+        fs::remove_dir_all(&stale_path).ok();
+    }
     if !status.status.success() {
         eprintln!(
             "  ERROR: git clone failed: {}",
@@ -109,16 +174,21 @@ fn setup_repo(name: &str, url: &str, commit_sha: &str, repo_path: &Path) {
     println!("  {name}: checked out {}", &commit_sha[..8]);
 }
 
-/// Clone all real-world benchmark repos.
-pub fn setup_repos() {
+/// Clone all real-world benchmark repos. `partial` makes blobless clones,
+/// which are quicker to set up but not comparable to full-clone results.
+pub fn setup_repos(partial: bool) {
     let repos_dir = config::repos_dir();
     fs::create_dir_all(&repos_dir).expect("Failed to create repos directory");
 
     println!("Setting up benchmark repositories...");
-    for (_, rc) in config::repos() {
-        let path = rc.path(&repos_dir);
-        setup_repo(rc.name, rc.url, rc.commit_sha, &path);
-    }
+    // Each repo clones into its own directory, so the network-bound clones
+    // can overlap. Progress lines from different repos may interleave.
+    thread::scope(|s| {
+        for rc in config::repos().values() {
+            let path = rc.path(&repos_dir);
+            s.spawn(move || setup_repo(rc.name, rc.url, rc.commit_sha, &path, partial));
+        }
+    });
     // Generate MCP config pointing to the real glean binary
     if let Err(e) = generate_mcp_config() {
         eprintln!("  WARNING: {e}");
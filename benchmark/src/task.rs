@@ -1,3 +1,4 @@
+use crate::text::contains_ignore_ascii_case;
 use std::path::{Path, PathBuf};
 use std::process::Command;
 
@@ -75,10 +76,9 @@ pub trait Task: Sync {
     /// text and the diff output — a match in either counts.
     fn check_correctness(&self, result_text: &str, repo_path: &Path) -> (bool, String) {
         let gt = self.ground_truth();
-        let text_lower = result_text.to_lowercase();
 
         for forbidden in &gt.forbidden_strings {
-            if text_lower.contains(&forbidden.to_lowercase()) {
+            if contains_ignore_ascii_case(result_text, forbidden) {
                 return (false, format!("Contains forbidden: {forbidden}"));
             }
         }
@@ -111,14 +111,13 @@ pub trait Task: Sync {
         };
 
         // Check required strings against assistant text + diff (if available).
-        let search_text = if let Some(ref diff) = diff_text {
-            format!("{text_lower}\n{}", diff.to_lowercase())
-        } else {
-            text_lower
-        };
-
+        // The two are searched in turn rather than joined into one copy.
         for required in &gt.required_strings {
-            if !search_text.contains(&required.to_lowercase()) {
+            let found = contains_ignore_ascii_case(result_text, required)
+                || diff_text
+                    .as_deref()
+                    .is_some_and(|diff| contains_ignore_ascii_case(diff, required));
+            if !found {
                 return (false, format!("Missing: {required}"));
             }
         }
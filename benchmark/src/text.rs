@@ -0,0 +1,43 @@
+use std::collections::HashSet;
+use std::sync::Arc;
+
+/// Case-insensitive substring test that never copies `haystack`.
+/// Callers match ASCII strings (model names, ground truth), so ASCII case
+/// folding is all they need. An empty `needle` is contained in everything.
+pub fn contains_ignore_ascii_case(haystack: &str, needle: &str) -> bool {
+    let (haystack, needle) = (haystack.as_bytes(), needle.as_bytes());
+    needle.is_empty()
+        || haystack
+            .windows(needle.len())
+            .any(|w| w.eq_ignore_ascii_case(needle))
+}
+
+/// Hands out one shared allocation per distinct string.
+#[derive(Default)]
+pub struct Interner(HashSet<Arc<str>>);
+
+impl Interner {
+    pub fn intern(&mut self, s: &str) -> Arc<str> {
+        if let Some(existing) = self.0.get(s) {
+            return Arc::clone(existing);
+        }
+        let new: Arc<str> = Arc::from(s);
+        self.0.insert(Arc::clone(&new));
+        new
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::contains_ignore_ascii_case;
+
+    #[test]
+    fn contains_ignore_ascii_case_cases() {
+        assert!(contains_ignore_ascii_case("claude-OPUS-4", "opus"));
+        assert!(contains_ignore_ascii_case("Opus", "OPUS"));
+        assert!(!contains_ignore_ascii_case("sonnet", "opus"));
+        assert!(!contains_ignore_ascii_case("op", "opus"));
+        assert!(contains_ignore_ascii_case("anything", ""));
+        assert!(contains_ignore_ascii_case("", ""));
+    }
+}